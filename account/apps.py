@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AccountConfig(AppConfig):
+    name = "account"
+
+    def ready(self):
+        from . import signals  # noqa
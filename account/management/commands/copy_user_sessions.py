@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from account.models import User
+from account.user_sessions import UserSessions
+
+# 复制之后清空, 再次运行时只处理还没有复制的用户
+SELECT_SQL = 'SELECT id, session_keys FROM "user" WHERE session_keys IS NOT NULL AND id > %s ORDER BY id LIMIT %s'
+CLEAR_SQL = 'UPDATE "user" SET session_keys = NULL WHERE id = ANY(%s)'
+
+
+class Command(BaseCommand):
+    help = "Copy the session keys stored in the legacy user.session_keys column to redis"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            columns = [column.name for column in connection.introspection.get_table_description(cursor, User._meta.db_table)]
+        if "session_keys" not in columns:
+            self.stdout.write("No legacy session keys to copy")
+            return
+
+        last_id, total = 0, 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(SELECT_SQL, [last_id, options["batch"]])
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                # django 不解析 jsonb, 查询结果是字符串
+                for user_id, session_keys in rows:
+                    session_keys = json.loads(session_keys)
+                    if session_keys:
+                        UserSessions.add(user_id, *session_keys)
+                cursor.execute(CLEAR_SQL, [[user_id for user_id, _ in rows]])
+            last_id = rows[-1][0]
+            total += len(rows)
+        self.stdout.write(self.style.SUCCESS(f"Copied the session keys of {total} users"))
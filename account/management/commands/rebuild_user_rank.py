@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from account.user_rank import UserRank
+
+
+class Command(BaseCommand):
+    help = "Rebuild the global ACM and OI user rankings in redis from the database"
+
+    def handle(self, *args, **options):
+        counts = UserRank.rebuild()
+        self.stdout.write(self.style.SUCCESS(", ".join(f"{rule_type}: {count} users" for rule_type, count in counts.items())))
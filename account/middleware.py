@@ -1,22 +1,57 @@
+import re
+
 from django.conf import settings
 from django.db import connection
-from django.utils.timezone import now
 from django.utils.deprecation import MiddlewareMixin
 
 from utils.api import JSONResponse
-from account.models import User
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.throttling import SlidingWindow
+from account.open_api import OpenAPIAppkeyCache
+from account.user_sessions import UserSessions
 
 
 class APITokenAuthMiddleware(MiddlewareMixin):
     def process_request(self, request):
         appkey = request.META.get("HTTP_APPKEY")
         if appkey:
-            try:
-                request.user = User.objects.get(open_api_appkey=appkey, open_api=True, is_disabled=False)
+            user = OpenAPIAppkeyCache.get_user(appkey)
+            if user:
+                request.user = user
                 request.csrf_processing_done = True
                 request.auth_method = "api_key"
-            except User.DoesNotExist:
-                pass
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    根据 settings.RATE_LIMITS 对路由限流, 在 view 和 serializer 之前拒绝超出限制的请求
+    """
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.policies = []
+        for index, policy in enumerate(settings.RATE_LIMITS):
+            self.policies.append(dict(policy, index=index, path=re.compile(policy["path"])))
+
+    def _get_key(self, request, policy):
+        key_type = policy["key"]
+        if key_type == "user" and request.user.is_authenticated:
+            return f"user:{request.user.id}"
+        if key_type == "session" and request.session.session_key:
+            return f"session:{request.session.session_key}"
+        # 取不到 ip 的请求共用一个计数
+        return "ip:" + (request.META.get(settings.IP_HEADER) or request.META.get("REMOTE_ADDR") or "unknown")
+
+    def process_request(self, request):
+        path = request.path_info
+        for policy in self.policies:
+            if not policy["path"].match(path) or (policy.get("methods") and request.method not in policy["methods"]):
+                continue
+            key = f"{CacheKey.throttling}:route:{policy['index']}:{self._get_key(request, policy)}"
+            can_consume, wait = SlidingWindow(key=key, limit=policy["limit"], window=policy["window"],
+                                              redis_conn=cache).consume()
+            if not can_consume:
+                return JSONResponse.response({"error": "error", "data": "Too many requests, please wait %d seconds" % (int(wait) + 1)})
 
 
 class SessionRecordMiddleware(MiddlewareMixin):
@@ -24,13 +59,14 @@ class SessionRecordMiddleware(MiddlewareMixin):
         request.ip = request.META.get(settings.IP_HEADER, request.META.get("REMOTE_ADDR"))
         if request.user.is_authenticated:
             session = request.session
-            session["user_agent"] = request.META.get("HTTP_USER_AGENT", "")
-            session["ip"] = request.ip
-            session["last_activity"] = now()
-            user_sessions = request.user.session_keys
-            if session.session_key not in user_sessions:
-                user_sessions.append(session.session_key)
-                request.user.save()
+            user_agent = request.META.get("HTTP_USER_AGENT", "")
+            # 只有变化时才修改 session, 否则每个请求都会重新写入 session
+            if session.get("user_agent") != user_agent:
+                session["user_agent"] = user_agent
+            if session.get("ip") != request.ip:
+                session["ip"] = request.ip
+            if session.session_key:
+                UserSessions.record(request.user.id, session.session_key)
 
 
 class AdminRoleRequiredMiddleware(MiddlewareMixin):
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.9 on 2026-10-19 06:32
+
+from django.db import migrations
+
+# session key 改为保存在 redis 中, 这里只从 model 中去掉 session_keys, 数据库中的列改为可以为 NULL
+# 已有的数据由 copy_user_sessions 命令复制到 redis, 所有部署都运行过这个命令之后再删除这一列
+DROP_NOT_NULL_SQL = 'ALTER TABLE "user" ALTER COLUMN session_keys DROP NOT NULL'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(DROP_NOT_NULL_SQL)],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='user',
+                    name='session_keys',
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def trigram_index(table, name, column):
+    # 和 icontains 生成的 UPPER("column"::text) LIKE UPPER(...) 一致, 否则不会使用索引
+    return migrations.RunSQL(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" USING gin (UPPER("{column}"::text) gin_trgm_ops)',
+        f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def prefix_index(table, name, column):
+    return migrations.RunSQL(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" (UPPER("{column}"::text) text_pattern_ops)',
+        f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('account', '0003_user_open_api_appkey_index'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        trigram_index("user", "user_username_trgm_idx", "username"),
+        trigram_index("user", "user_email_trgm_idx", "email"),
+        trigram_index("user_profile", "user_profile_real_name_trgm_idx", "real_name"),
+        prefix_index("user", "user_username_prefix_idx", "username"),
+    ]
@@ -40,10 +40,9 @@ class User(AbstractBaseUser):
     auth_token = models.TextField(null=True)
     two_factor_auth = models.BooleanField(default=False)
     tfa_token = models.TextField(null=True)
-    session_keys = JSONField(default=list)
     # open api key
     open_api = models.BooleanField(default=False)
-    open_api_appkey = models.TextField(null=True)
+    open_api_appkey = models.TextField(null=True, db_index=True)
     is_disabled = models.BooleanField(default=False)
 
     USERNAME_FIELD = "username"
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import time
+
+from utils.cache import cache
+from utils.constants import CacheKey
+from .models import User
+
+
+class OpenAPIAppkeyCache(object):
+    """
+    appkey -> 用户的缓存, 进程内缓存 local_ttl 秒, redis 中缓存 ttl 秒
+     - key 使用 appkey 的 sha256, redis 中不保存明文 appkey
+     - 用户被修改(包括更换 appkey 和禁用)或删除时由 account.signals 清除
+     - 只缓存鉴权需要的字段, 不缓存密码等敏感字段, 其他字段在访问时从数据库加载
+     - 每次返回新的 User 对象, view 中修改 request.user 不会影响缓存
+    """
+    fields = ("id", "username", "admin_type", "problem_permission", "quiz_permission", "open_api", "is_disabled")
+    ttl = 3600
+    local_ttl = 5
+    _max_local = 10000
+    _local = {}
+
+    @staticmethod
+    def _key(appkey):
+        return f"{CacheKey.open_api_appkey}:{hashlib.sha256(appkey.encode('utf-8')).hexdigest()}"
+
+    @classmethod
+    def get_user(cls, appkey):
+        key = cls._key(appkey)
+        now = time.time()
+        item = cls._local.get(key)
+        if item and item[1] > now:
+            return cls._load(item[0])
+
+        data = cache.get(key)
+        if data is None:
+            values = User.objects.filter(open_api_appkey=appkey, open_api=True, is_disabled=False) \
+                .values_list(*cls.fields).first()
+            if values is None:
+                return None
+            data = json.dumps(values)
+            cache.set(key, data, timeout=cls.ttl)
+        if len(cls._local) >= cls._max_local:
+            cls._local.clear()
+        cls._local[key] = (data, now + cls.local_ttl)
+        return cls._load(data)
+
+    @classmethod
+    def _load(cls, data):
+        return User.from_db("default", cls.fields, json.loads(data))
+
+    @classmethod
+    def invalidate(cls, *appkeys):
+        keys = [cls._key(appkey) for appkey in appkeys if appkey]
+        for key in keys:
+            cls._local.pop(key, None)
+        if keys:
+            cache.delete_many(keys)
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import User, UserProfile
+from .open_api import OpenAPIAppkeyCache
+from .user_rank import RANK_FIELDS, UserRank
+
+
+def remember_open_api_appkey(sender, instance, **kwargs):
+    # 不要直接访问 instance.open_api_appkey, 在 only()/defer() 的查询中会触发额外的 sql
+    instance._original_open_api_appkey = instance.__dict__.get("open_api_appkey")
+
+
+def invalidate_open_api_appkey(sender, instance, **kwargs):
+    # 用户的任何修改都要让缓存的用户失效, 更换 appkey 时旧的 appkey 也要失效
+    appkeys = {instance.__dict__.get("open_api_appkey"), getattr(instance, "_original_open_api_appkey", None)}
+    appkeys.discard(None)
+    instance._original_open_api_appkey = instance.__dict__.get("open_api_appkey")
+    if appkeys:
+        OpenAPIAppkeyCache.invalidate(*appkeys)
+        # 事务提交前其他请求可能又缓存了旧的数据
+        transaction.on_commit(lambda: OpenAPIAppkeyCache.invalidate(*appkeys))
+
+
+def update_user_rank(sender, instance, update_fields=None, **kwargs):
+    # 判题时 UserProfile 的计数变化, 或者用户被禁用, 修改了 admin_type
+    fields = RANK_FIELDS if sender is UserProfile else ("admin_type", "is_disabled")
+    if update_fields and not set(update_fields) & set(fields):
+        return
+    UserRank.update(instance.user_id if sender is UserProfile else instance.id)
+
+
+post_init.connect(remember_open_api_appkey, sender=User)
+post_save.connect(invalidate_open_api_appkey, sender=User)
+post_delete.connect(invalidate_open_api_appkey, sender=User)
+post_save.connect(update_user_rank, sender=User)
+post_delete.connect(update_user_rank, sender=User)
+post_save.connect(update_user_rank, sender=UserProfile)
@@ -2,7 +2,10 @@ import logging
 import dramatiq
 
 from options.options import SysOptions
+from utils.cache import cache
+from utils.constants import CacheKey
 from utils.shortcuts import send_email, DRAMATIQ_WORKER_ARGS
+from .user_rank import UserRank
 
 logger = logging.getLogger(__name__)
 
@@ -20,3 +23,11 @@ def send_email_async(from_name, to_email, to_name, subject, content):
                    content=content)
     except Exception as e:
         logger.exception(e)
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def rebuild_user_rank():
+    try:
+        UserRank.rebuild()
+    finally:
+        cache.delete(CacheKey.user_rank_rebuilding)
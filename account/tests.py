@@ -1,19 +1,31 @@
+import json
 import time
+from io import StringIO
 
 from unittest import mock
 from datetime import timedelta
 from copy import deepcopy
 
 from django.contrib import auth
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
 from django.utils.timezone import now
 from otpauth import OtpAuth
 
+from utils.api import JSONResponse
 from utils.api.tests import APIClient, APITestCase
-from utils.shortcuts import rand_str
+from utils.cache import cache
+from utils.captcha import CaptchaPool
+from utils.shortcuts import keyword_filter, rand_str
 from options.options import SysOptions
 
-from .models import AdminType, ProblemPermission, User
-from utils.constants import ContestRuleType
+from .models import AdminType, ProblemPermission, User, UserProfile
+from .open_api import OpenAPIAppkeyCache
+from .tasks import rebuild_user_rank
+from .user_rank import UserRank
+from .user_sessions import UserSessions
+from utils.constants import CacheKey, ContestRuleType
 
 
 class PermissionDecoratorTest(APITestCase):
@@ -160,6 +172,37 @@ class UserLoginAPITest(APITestCase):
         self.assertDictEqual(resp.data, {"error": "error", "data": "Your account has been disabled"})
 
 
+@override_settings(RATE_LIMITS=[{"path": r"^/api/login/?$", "methods": ["POST"], "key": "ip", "limit": 2, "window": 60}])
+class RateLimitMiddlewareTest(APITestCase):
+    def setUp(self):
+        self.create_user(username="test", password="test", login=False)
+        self.login_url = self.reverse("user_login_api")
+
+    @mock.patch("account.views.oj.UserLoginAPI.post")
+    def test_rejected_before_view(self, mocked_post):
+        mocked_post.return_value = JSONResponse.response({"error": None, "data": "Succeeded"})
+        data = {"username": "test", "password": "wrong"}
+        self.client.post(self.login_url, data=data)
+        self.client.post(self.login_url, data=data)
+        self.assertEqual(mocked_post.call_count, 2)
+        resp = self.client.post(self.login_url, data=data)
+        self.assertFailed(resp)
+        self.assertTrue(resp.data["data"].startswith("Too many requests"))
+        self.assertEqual(mocked_post.call_count, 2)
+
+    def test_limit_per_ip(self):
+        data = {"username": "test", "password": "test"}
+        for _ in range(2):
+            self.assertSuccess(self.client.post(self.login_url, data=data))
+        self.assertSuccess(self.client.post(self.login_url, data=data, HTTP_X_REAL_IP="10.0.0.2"))
+
+    def test_missing_ip(self):
+        data = {"username": "test", "password": "test"}
+        for _ in range(2):
+            self.assertSuccess(self.client.post(self.login_url, data=data, REMOTE_ADDR=None))
+        self.assertFailed(self.client.post(self.login_url, data=data, REMOTE_ADDR=None))
+
+
 class CaptchaTest(APITestCase):
     def _set_captcha(self, session):
         captcha = rand_str(4)
@@ -169,6 +212,39 @@ class CaptchaTest(APITestCase):
         return captcha
 
 
+class CaptchaAPITest(APITestCase):
+    def setUp(self):
+        self.url = self.reverse("show_captcha")
+        cache.delete_many([CacheKey.captcha_pool, CacheKey.captcha_pool_refilling])
+
+    def tearDown(self):
+        cache.delete_many([CacheKey.captcha_pool, CacheKey.captcha_pool_refilling])
+        super().tearDown()
+
+    @mock.patch("utils.tasks.refill_captcha_pool.send")
+    def test_render_when_pool_is_empty(self, mocked_send):
+        resp = self.client.get(self.url)
+        self.assertSuccess(resp)
+        self.assertTrue(resp.data["data"].startswith("data:image/png;base64,"))
+        self.assertEqual(len(self.client.session["_django_captcha_key"]), 4)
+        mocked_send.assert_called_once_with()
+        # 补充任务已经在执行, 不会重复提交
+        self.client.get(self.url)
+        mocked_send.assert_called_once_with()
+
+    @mock.patch("utils.tasks.refill_captcha_pool.send")
+    @mock.patch("utils.captcha.CaptchaPool.size", 4)
+    def test_pop_from_pool(self, mocked_send):
+        CaptchaPool.refill()
+        self.assertEqual(cache.llen(CacheKey.captcha_pool), 4)
+        answer = cache.lindex(CacheKey.captcha_pool, 0).decode("utf-8").split(":", 1)[0]
+        resp = self.client.get(self.url)
+        self.assertSuccess(resp)
+        self.assertEqual(self.client.session["_django_captcha_key"], answer)
+        self.assertEqual(cache.llen(CacheKey.captcha_pool), 3)
+        mocked_send.assert_not_called()
+
+
 class UserRegisterAPITest(CaptchaTest):
     def setUp(self):
         self.client = APIClient()
@@ -228,9 +304,35 @@ class SessionManagementAPITest(APITestCase):
         data = resp.data["data"]
         self.assertEqual(len(data), 1)
 
-    # def test_delete_session_key(self):
-    #     resp = self.client.delete(self.url + "?session_key=" + self.session_key)
-    #     self.assertSuccess(resp)
+    def test_dead_sessions_are_pruned(self):
+        user = User.objects.get(username="test")
+        cache.sadd(UserSessions._keys_key(user.id), "dead-session-1", "dead-session-2")
+        resp = self.client.get(self.url)
+        self.assertEqual(len(resp.data["data"]), 1)
+        self.assertFalse(cache.sismember(UserSessions._keys_key(user.id), "dead-session-1"))
+
+    def test_copy_legacy_session_keys(self):
+        user = User.objects.get(username="test")
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE "user" SET session_keys = %s WHERE id = %s', [json.dumps(["legacy-session"]), user.id])
+        call_command("copy_user_sessions", stdout=StringIO())
+        self.assertTrue(cache.sismember(UserSessions._keys_key(user.id), "legacy-session"))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM "user" WHERE session_keys IS NOT NULL')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_delete_session_key(self):
+        session_key = self.client.get(self.url).data["data"][0]["session_key"]
+        resp = self.client.delete(self.url + "?session_key=" + session_key)
+        self.assertSuccess(resp)
+
+    def test_session_only_saved_when_changed(self):
+        self.client.get(self.url)
+        with mock.patch("django.contrib.sessions.backends.cache.SessionStore.save") as mocked_save:
+            self.client.get(self.url)
+            mocked_save.assert_not_called()
+            self.client.get(self.url, HTTP_USER_AGENT="another browser")
+            mocked_save.assert_called_once()
 
     def test_delete_session_with_invalid_key(self):
         resp = self.client.delete(self.url + "?session_key=aaaaaaaaaa")
@@ -460,6 +562,24 @@ class UserRankAPITest(APITestCase):
         profile2.accepted_number = 10
         profile2.total_score = 700
         profile2.save()
+        UserRank.rebuild()
+
+    @mock.patch("account.tasks.rebuild_user_rank.send")
+    def test_rank_before_built(self, mocked_send):
+        # 排名还没有生成时从数据库查询, 只触发一次后台重建
+        cache.delete(CacheKey.user_rank_built)
+        test2 = User.objects.get(username="test2")
+        resp = self.client.get(self.url, data={"rule": ContestRuleType.OI})
+        self.assertEqual([item["user"]["username"] for item in resp.data["data"]["results"]], ["test2", "test1"])
+        self.assertEqual(resp.data["data"]["total"], 2)
+        resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM, "user_id": test2.id})
+        self.assertEqual(resp.data["data"]["rank"], 2)
+        mocked_send.assert_called_once_with()
+
+        rebuild_user_rank()
+        self.assertTrue(UserRank.built())
+        self.assertIsNone(cache.get(CacheKey.user_rank_rebuilding))
+        self.assertEqual(UserRank.position(ContestRuleType.ACM, test2.id), 2)
 
     def test_get_acm_rank(self):
         resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM})
@@ -491,6 +611,41 @@ class UserRankAPITest(APITestCase):
         self.assertSuccess(resp)
         self.assertEqual(len(resp.data["data"]), 2)
 
+    def test_rank_updates(self):
+        test1, test2 = User.objects.get(username="test1"), User.objects.get(username="test2")
+        self.create_user("test3", "test123", login=False)
+        test3 = User.objects.get(username="test3")
+        self.assertEqual(self.client.get(self.url, data={"user_id": test3.id}).data["data"]["rank"], None)
+
+        # 和判题时一样使用 F() 更新计数, 每次重新读取, 否则 save() 会再次执行之前的 F()
+        UserProfile.objects.get(user=test3).add_submission_number()
+        UserProfile.objects.get(user=test3).add_score(300)
+        for _ in range(11):
+            UserProfile.objects.get(user=test3).add_accepted_problem_number()
+        resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM})
+        self.assertEqual([item["user"]["username"] for item in resp.data["data"]["results"]], ["test3", "test1", "test2"])
+        self.assertEqual(resp.data["data"]["total"], 3)
+        self.assertEqual(self.client.get(self.url, data={"rule": ContestRuleType.OI, "user_id": test3.id})
+                         .data["data"]["rank"], 2)
+
+        # 分数相同时名次相同, 被禁用之后不在排名中
+        test1.userprofile.total_score = 700
+        test1.userprofile.save(update_fields=["total_score"])
+        self.assertEqual(self.client.get(self.url, data={"rule": ContestRuleType.OI, "user_id": test1.id})
+                         .data["data"]["rank"], 1)
+        test2.is_disabled = True
+        test2.save()
+        self.assertEqual(self.client.get(self.url, data={"rule": ContestRuleType.OI, "user_id": test3.id})
+                         .data["data"]["rank"], 2)
+        resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM, "offset": 1, "limit": 1})
+        self.assertEqual([item["user"]["username"] for item in resp.data["data"]["results"]], ["test1"])
+
+        # 从数据库重建
+        cache.delete(f"{CacheKey.user_rank}:{ContestRuleType.ACM}")
+        call_command("rebuild_user_rank", stdout=StringIO())
+        resp = self.client.get(self.url, data={"rule": ContestRuleType.ACM})
+        self.assertEqual([item["user"]["username"] for item in resp.data["data"]["results"]], ["test3", "test1"])
+
 
 class ProfileProblemDisplayIDRefreshAPITest(APITestCase):
     def setUp(self):
@@ -512,6 +667,12 @@ class AdminUserTest(APITestCase):
         response = self.client.get(self.url)
         self.assertSuccess(response)
 
+    def test_user_list_search(self):
+        self.create_user(username="atest", password="test", login=False)
+        users = User.objects.order_by("username")
+        self.assertEqual([u.username for u in users.filter(keyword_filter("TES", "username"))], ["atest", "test"])
+        self.assertEqual([u.username for u in users.filter(keyword_filter("^tes", "username"))], ["test"])
+
     def test_edit_user_successfully(self):
         response = self.client.put(self.url, data=self.data)
         self.assertSuccess(response)
@@ -644,3 +805,36 @@ class OpenAPIAppkeyAPITest(APITestCase):
         resp = self.client.post(self.url, data={})
         self.assertSuccess(resp)
         self.assertEqual(resp.data["data"]["appkey"], User.objects.get(username=self.user.username).open_api_appkey)
+
+    def test_appkey_auth_is_cached(self):
+        self.user.open_api = True
+        self.user.open_api_appkey = rand_str()
+        self.user.save()
+        self.assertEqual(OpenAPIAppkeyCache.get_user(self.user.open_api_appkey).id, self.user.id)
+        with self.assertNumQueries(0):
+            user = OpenAPIAppkeyCache.get_user(self.user.open_api_appkey)
+        self.assertEqual(user.id, self.user.id)
+        self.assertNotIn(self.user.password, cache.get(OpenAPIAppkeyCache._key(self.user.open_api_appkey)))
+        # 没有缓存的字段从数据库加载
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+        user.username = "changed"
+        self.assertEqual(OpenAPIAppkeyCache.get_user(self.user.open_api_appkey).username, self.user.username)
+
+    def test_rotate_appkey_invalidates_cache(self):
+        self.user.open_api = True
+        self.user.save()
+        old_appkey = self.client.post(self.url, data={}).data["data"]["appkey"]
+        self.assertIsNotNone(OpenAPIAppkeyCache.get_user(old_appkey))
+        new_appkey = self.client.post(self.url, data={}).data["data"]["appkey"]
+        self.assertIsNone(OpenAPIAppkeyCache.get_user(old_appkey))
+        self.assertEqual(OpenAPIAppkeyCache.get_user(new_appkey).id, self.user.id)
+
+    def test_disable_user_invalidates_cache(self):
+        self.user.open_api = True
+        self.user.open_api_appkey = rand_str()
+        self.user.save()
+        self.assertIsNotNone(OpenAPIAppkeyCache.get_user(self.user.open_api_appkey))
+        self.user.is_disabled = True
+        self.user.save()
+        self.assertIsNone(OpenAPIAppkeyCache.get_user(self.user.open_api_appkey))
@@ -0,0 +1,154 @@
+from django.db import connection, transaction
+from django.db.models import Q
+
+from utils.cache import cache
+from utils.constants import CacheKey, ContestRuleType
+from .models import AdminType, UserProfile
+
+# 排名使用的计数, 只修改其他字段时不需要更新排名
+RANK_FIELDS = ("accepted_number", "submission_number", "total_score")
+
+
+class UserRank(object):
+    """
+    全站排名, 保存在 redis 的 sorted set 中, member 是 user_id, 翻页和查询名次都是 O(log n)
+     - CacheKey.user_rank:ACM: score 为 accepted_number * 2^32 - submission_number, 通过数相同时提交数少的在前
+     - CacheKey.user_rank:OI: score 为 total_score
+     - 只包含没有被禁用的普通用户, ACM 要求 submission_number > 0, OI 要求 total_score > 0
+    UserProfile 和 User 保存之后由 account.signals 更新, 也可以使用 rebuild_user_rank 命令从数据库重建
+    排名还没有生成时从数据库排序查询, 同时由 account.tasks.rebuild_user_rank 在后台重建一次
+    """
+    rule_types = (ContestRuleType.ACM, ContestRuleType.OI)
+    batch_size = 10000
+
+    @staticmethod
+    def _key(rule_type):
+        return f"{CacheKey.user_rank}:{rule_type}"
+
+    @staticmethod
+    def _scores(accepted_number, submission_number, total_score):
+        """
+        返回 {rule_type: score}, 不在排名中时 score 为 None
+        """
+        return {ContestRuleType.ACM: accepted_number * 2 ** 32 - submission_number if submission_number > 0 else None,
+                ContestRuleType.OI: total_score if total_score > 0 else None}
+
+    @staticmethod
+    def _profiles():
+        return UserProfile.objects.filter(user__admin_type=AdminType.REGULAR_USER, user__is_disabled=False)
+
+    @staticmethod
+    def built():
+        return bool(cache.exists(CacheKey.user_rank_built))
+
+    @classmethod
+    def _ordered_profiles(cls, rule_type):
+        profiles = cls._profiles()
+        if rule_type == ContestRuleType.ACM:
+            return profiles.filter(submission_number__gt=0).order_by("-accepted_number", "submission_number")
+        return profiles.filter(total_score__gt=0).order_by("-total_score")
+
+    @staticmethod
+    def _schedule_rebuild():
+        # 同时只有一个后台任务在重建, 任务结束时删除这个 key
+        if cache.add(CacheKey.user_rank_rebuilding, 1, timeout=3600):
+            from account.tasks import rebuild_user_rank
+            rebuild_user_rank.send()
+
+    @classmethod
+    def rebuild(cls):
+        """
+        从数据库重建两个排名, 返回 {rule_type: 用户数}. 先写临时 key 再 rename, 重建过程中排名仍然可用,
+        但是重建期间其他进程的更新会被覆盖, 需要在判题不多的时候运行
+        """
+        tmp_keys = {rule_type: f"{cls._key(rule_type)}:rebuilding" for rule_type in cls.rule_types}
+        cache.delete_many(list(tmp_keys.values()))
+        counts = dict.fromkeys(cls.rule_types, 0)
+        rows = cls._profiles().values_list("user_id", *RANK_FIELDS).order_by("id").iterator(chunk_size=cls.batch_size)
+        pipe = cache.pipeline(transaction=False)
+        for index, (user_id, *fields) in enumerate(rows, 1):
+            for rule_type, score in cls._scores(*fields).items():
+                if score is not None:
+                    pipe.zadd(tmp_keys[rule_type], {user_id: score})
+                    counts[rule_type] += 1
+            if index % cls.batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+
+        pipe = cache.pipeline()
+        for rule_type in cls.rule_types:
+            if counts[rule_type]:
+                pipe.rename(tmp_keys[rule_type], cls._key(rule_type))
+            else:
+                pipe.delete(cls._key(rule_type))
+        pipe.set(CacheKey.user_rank_built, 1)
+        pipe.execute()
+        return counts
+
+    @classmethod
+    def _update(cls, user_id):
+        row = cls._profiles().filter(user_id=user_id).values_list(*RANK_FIELDS).first()
+        scores = cls._scores(*row) if row else dict.fromkeys(cls.rule_types)
+        pipe = cache.pipeline(transaction=False)
+        for rule_type, score in scores.items():
+            if score is None:
+                pipe.zrem(cls._key(rule_type), user_id)
+            else:
+                pipe.zadd(cls._key(rule_type), {user_id: score})
+        pipe.execute()
+
+    @classmethod
+    def update(cls, user_id):
+        """
+        从数据库读取用户当前的计数更新排名, 计数可能是 F() 表达式, 不能使用 instance 上的值
+        """
+        cls._update(user_id)
+        # 事务回滚时要恢复, 提交前其他进程也可能写入了旧的值
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: cls._update(user_id))
+
+    @classmethod
+    def page(cls, rule_type, offset, limit):
+        """
+        返回 (按名次排序的 UserProfile 列表, 总人数)
+        """
+        if not cls.built():
+            cls._schedule_rebuild()
+            profiles = cls._ordered_profiles(rule_type)
+            return list(profiles.select_related("user")[offset:offset + limit]), profiles.count()
+        key = cls._key(rule_type)
+        pipe = cache.pipeline(transaction=False)
+        pipe.zrevrange(key, offset, offset + limit - 1)
+        pipe.zcard(key)
+        user_ids, total = pipe.execute()
+        user_ids = [int(user_id) for user_id in user_ids]
+        profiles = {profile.user_id: profile for profile in
+                    UserProfile.objects.select_related("user").filter(user_id__in=user_ids)}
+        return [profiles[user_id] for user_id in user_ids if user_id in profiles], total
+
+    @classmethod
+    def position(cls, rule_type, user_id):
+        """
+        用户的名次, 分数相同的用户名次相同, 不在排名中时返回 None
+        """
+        if not cls.built():
+            cls._schedule_rebuild()
+            return cls._db_position(rule_type, user_id)
+        key = cls._key(rule_type)
+        score = cache.zscore(key, user_id)
+        if score is None:
+            return None
+        return cache.zcount(key, f"({score!r}", "+inf") + 1
+
+    @classmethod
+    def _db_position(cls, rule_type, user_id):
+        row = cls._profiles().filter(user_id=user_id).values_list(*RANK_FIELDS).first()
+        if row is None or cls._scores(*row)[rule_type] is None:
+            return None
+        accepted_number, submission_number, total_score = row
+        if rule_type == ContestRuleType.ACM:
+            better = Q(accepted_number__gt=accepted_number) | \
+                Q(accepted_number=accepted_number, submission_number__lt=submission_number)
+        else:
+            better = Q(total_score__gt=total_score)
+        return cls._ordered_profiles(rule_type).filter(better).count() + 1
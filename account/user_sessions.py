@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+
+from utils.cache import cache
+from utils.constants import CacheKey
+
+
+class UserSessions(object):
+    """
+    用户登录过的 session 和最后活动时间, 保存在 redis 中, 不再写入 session 和 User
+     - CacheKey.user_sessions:{user_id}: set, 用户的 session key
+     - CacheKey.session_activity:{user_id}: hash, session key -> 最后活动的时间戳
+    每个进程中同一个 session 在 record_interval 秒内最多写一次
+    """
+    record_interval = 60
+    _max_recorded = 10000
+    _recorded = {}
+
+    @staticmethod
+    def _keys_key(user_id):
+        return f"{CacheKey.user_sessions}:{user_id}"
+
+    @staticmethod
+    def _activity_key(user_id):
+        return f"{CacheKey.session_activity}:{user_id}"
+
+    @classmethod
+    def record(cls, user_id, session_key):
+        now = time.time()
+        if now - cls._recorded.get(session_key, 0) < cls.record_interval:
+            return
+        if len(cls._recorded) >= cls._max_recorded:
+            cls._recorded.clear()
+        cls._recorded[session_key] = now
+
+        keys_key, activity_key = cls._keys_key(user_id), cls._activity_key(user_id)
+        pipe = cache.pipeline(transaction=False)
+        pipe.sadd(keys_key, session_key)
+        pipe.hset(activity_key, session_key, now)
+        # 所有 session 都过期之后这两个 key 也不再需要
+        pipe.expire(keys_key, settings.SESSION_COOKIE_AGE)
+        pipe.expire(activity_key, settings.SESSION_COOKIE_AGE)
+        pipe.execute()
+
+    @classmethod
+    def add(cls, user_id, *session_keys):
+        """
+        添加 session key, 不记录最后活动时间
+        """
+        keys_key = cls._keys_key(user_id)
+        pipe = cache.pipeline(transaction=False)
+        pipe.sadd(keys_key, *session_keys)
+        pipe.expire(keys_key, settings.SESSION_COOKIE_AGE)
+        pipe.execute()
+
+    @classmethod
+    def load(cls, user_id):
+        """
+        一次请求同时读取 session key 和最后活动时间
+        """
+        pipe = cache.pipeline(transaction=False)
+        pipe.smembers(cls._keys_key(user_id))
+        pipe.hgetall(cls._activity_key(user_id))
+        session_keys, last_activity = pipe.execute()
+        return [item.decode("utf-8") for item in session_keys], \
+            {k.decode("utf-8"): float(v) for k, v in last_activity.items()}
+
+    @classmethod
+    def remove(cls, user_id, *session_keys):
+        """
+        返回实际删除的 session 数量
+        """
+        pipe = cache.pipeline(transaction=False)
+        pipe.srem(cls._keys_key(user_id), *session_keys)
+        pipe.hdel(cls._activity_key(user_id), *session_keys)
+        for session_key in session_keys:
+            cls._recorded.pop(session_key, None)
+        return pipe.execute()[0]
@@ -3,13 +3,12 @@ import re
 import xlsxwriter
 
 from django.db import transaction, IntegrityError
-from django.db.models import Q
 from django.http import HttpResponse
 from django.contrib.auth.hashers import make_password
 
 from submission.models import Submission
 from utils.api import APIView, validate_serializer
-from utils.shortcuts import rand_str
+from utils.shortcuts import keyword_filter, rand_str
 
 from ..decorators import super_admin_required
 from ..models import AdminType, ProblemPermission, User, UserProfile,QuizPermission
@@ -123,9 +122,7 @@ class UserAdminAPI(APIView):
 
         keyword = request.GET.get("keyword", None)
         if keyword:
-            user = user.filter(Q(username__icontains=keyword) |
-                               Q(userprofile__real_name__icontains=keyword) |
-                               Q(email__icontains=keyword))
+            user = user.filter(keyword_filter(keyword, "username", "userprofile__real_name", "email"))
         return self.success(self.paginate_data(request, user, UserAdminSerializer))
 
     @super_admin_required
@@ -1,10 +1,11 @@
 import os
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from importlib import import_module
 
 import qrcode
 from django.conf import settings
 from django.contrib import auth
+from django.core.cache import caches
 from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.utils.timezone import now
@@ -18,7 +19,7 @@ from utils.api import APIView, validate_serializer, CSRFExemptAPIView
 from utils.captcha import Captcha
 from utils.shortcuts import rand_str, img2base64, datetime2str
 from ..decorators import login_required
-from ..models import User, UserProfile, AdminType
+from ..models import User, UserProfile
 from ..serializers import (ApplyResetPasswordSerializer, ResetPasswordSerializer,
                            UserChangePasswordSerializer, UserLoginSerializer,
                            UserRegisterSerializer, UsernameOrEmailCheckSerializer,
@@ -26,6 +27,8 @@ from ..serializers import (ApplyResetPasswordSerializer, ResetPasswordSerializer
 from ..serializers import (TwoFactorAuthCodeSerializer, UserProfileSerializer,
                            EditUserProfileSerializer, ImageUploadForm)
 from ..tasks import send_email_async
+from ..user_rank import UserRank
+from ..user_sessions import UserSessions
 
 
 class UserProfileAPI(APIView):
@@ -334,17 +337,18 @@ class SessionManagementAPI(APIView):
     @login_required
     def get(self, request):
         engine = import_module(settings.SESSION_ENGINE)
-        session_store = engine.SessionStore
+        key_prefix = engine.SessionStore.cache_key_prefix
         current_session = request.session.session_key
-        session_keys = request.user.session_keys
+        session_keys, last_activity = UserSessions.load(request.user.id)
+        # 所有 session 在一次 MGET 中读取
+        sessions = caches[settings.SESSION_CACHE_ALIAS].get_many([key_prefix + key for key in session_keys])
         result = []
-        modified = False
-        for key in session_keys[:]:
-            session = session_store(key)
+        dead_keys = []
+        for key in session_keys:
+            session = sessions.get(key_prefix + key)
             # session does not exist or is expiry
-            if not session._session:
-                session_keys.remove(key)
-                modified = True
+            if not session:
+                dead_keys.append(key)
                 continue
 
             s = {}
@@ -352,11 +356,15 @@ class SessionManagementAPI(APIView):
                 s["current_session"] = True
             s["ip"] = session["ip"]
             s["user_agent"] = session["user_agent"]
-            s["last_activity"] = datetime2str(session["last_activity"])
+            if key in last_activity:
+                s["last_activity"] = datetime2str(datetime.fromtimestamp(last_activity[key], tz=timezone.utc))
+            else:
+                # 旧版本把最后活动时间保存在 session 中
+                s["last_activity"] = datetime2str(session["last_activity"]) if "last_activity" in session else None
             s["session_key"] = key
             result.append(s)
-        if modified:
-            request.user.save()
+        if dead_keys:
+            UserSessions.remove(request.user.id, *dead_keys)
         return self.success(result)
 
     @login_required
@@ -365,9 +373,7 @@ class SessionManagementAPI(APIView):
         if not session_key:
             return self.error("Parameter Error")
         request.session.delete(session_key)
-        if session_key in request.user.session_keys:
-            request.user.session_keys.remove(session_key)
-            request.user.save()
+        if UserSessions.remove(request.user.id, session_key):
             return self.success("Succeeded")
         else:
             return self.error("Invalid session_key")
@@ -378,13 +384,21 @@ class UserRankAPI(APIView):
         rule_type = request.GET.get("rule")
         if rule_type not in ContestRuleType.choices():
             rule_type = ContestRuleType.ACM
-        profiles = UserProfile.objects.filter(user__admin_type=AdminType.REGULAR_USER, user__is_disabled=False) \
-            .select_related("user")
-        if rule_type == ContestRuleType.ACM:
-            profiles = profiles.filter(submission_number__gt=0).order_by("-accepted_number", "submission_number")
-        else:
-            profiles = profiles.filter(total_score__gt=0).order_by("-total_score")
-        return self.success(self.paginate_data(request, profiles, RankInfoSerializer))
+        # 查询某个用户的名次, 不在排名中时为 None
+        user_id = request.GET.get("user_id")
+        if user_id:
+            try:
+                user_id = int(user_id)
+            except ValueError:
+                return self.error("Invalid user_id")
+            return self.success({"user_id": user_id, "rank": UserRank.position(rule_type, user_id)})
+
+        try:
+            offset = max(int(request.GET.get("offset", "0")), 0)
+        except ValueError:
+            offset = 0
+        profiles, total = UserRank.page(rule_type, offset, self._get_limit(request))
+        return self.success({"results": RankInfoSerializer(profiles, many=True).data, "total": total})
 
 
 class ProfileProblemDisplayIDRefreshAPI(APIView):
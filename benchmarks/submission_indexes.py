@@ -0,0 +1,116 @@
+"""
+提交列表常用过滤条件的查询计划和耗时
+
+用法:
+    POSTGRES_DB=onlinejudge_benchmark python manage.py migrate
+    POSTGRES_DB=onlinejudge_benchmark python benchmarks/submission_indexes.py --rows 2000000
+在一个事务中向 submission 表插入 rows 条模拟数据, 分别在有和没有 submission_*_idx 索引时执行 EXPLAIN ANALYZE,
+最后回滚事务, 不会留下数据. 执行期间会锁住 submission 表并删除索引, 所以只能在名字以 _benchmark 结尾的临时数据库中运行
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oj.settings")
+
+CONTESTS = 50
+PROBLEMS = 2000
+USERS = 50000
+# submission.migrations.0003 中使用 RunSQL 创建的索引, 不在 Submission._meta.indexes 中
+SEARCH_INDEXES = ["submission_username_trgm_idx", "submission_username_prefix_idx"]
+
+SEED_SQL = f"""
+INSERT INTO submission (id, contest_id, problem_id, quiz_id, create_time, user_id, username, code_compressed, result,
+                        info_compressed, language, shared, statistic_info, ip)
+SELECT md5('benchmark' || g), CASE WHEN mod(g, 10) = 0 THEN mod(g / 10, {CONTESTS}) + 1 END, mod(g * 7919, {PROBLEMS}) + 1, 1,
+       now() - (g * interval '10 seconds'), mod(g * 104729, {USERS}) + 1, 'user' || (mod(g * 104729, {USERS}) + 1),
+       decode('00', 'hex'), mod(g, 11) - 2, decode('007b7d', 'hex'), 'C', false, '{{}}', '127.0.0.1'
+FROM generate_series(1::bigint, %s) AS g
+"""
+
+
+def check_database(connection):
+    name = connection.settings_dict["NAME"]
+    if os.environ.get("OJ_ENV") == "production" or not name.endswith("_benchmark"):
+        sys.exit(f"refusing to run against database {name!r}, use a throwaway database named *_benchmark")
+
+
+def build_queries():
+    from submission.models import Submission
+    from utils.shortcuts import keyword_filter
+
+    # 按照 SEED_SQL 中的分布, problem 2 和 user 2 只有非比赛的提交, problem 1 只有比赛的提交
+    public = Submission.objects.filter(contest_id__isnull=True)
+    contest = Submission.objects.filter(contest_id=1)
+    start_time = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+    return [
+        ("public", public),
+        ("public + problem", public.filter(problem_id=2)),
+        ("public + user", public.filter(user_id=2)),
+        ("public + result", public.filter(result=0)),
+        ("public + problem + result", public.filter(problem_id=2, result=0)),
+        ("public + user + problem", public.filter(user_id=2, problem_id=2)),
+        ("public + username", public.filter(keyword_filter("user4242", "username"))),
+        ("public + ^username", public.filter(keyword_filter("^user4242", "username"))),
+        ("contest + start_time", contest.filter(create_time__gte=start_time)),
+        ("contest + user", contest.filter(user_id=1)),
+        ("contest + problem", contest.filter(problem_id=1)),
+    ]
+
+
+def run_queries(queries, limit, verbose):
+    results = {}
+    for name, query_set in queries:
+        query_set = query_set.order_by("-create_time", "-id")[:limit]
+        plan = query_set.explain(analyze=True)
+        start = time.perf_counter()
+        list(query_set.values_list("id", flat=True))
+        results[name] = (time.perf_counter() - start) * 1000
+        if verbose:
+            print(f"--- {name}\n{plan}\n")
+        else:
+            print(f"--- {name}: {plan.splitlines()[0]}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--verbose", action="store_true", help="print full EXPLAIN ANALYZE output")
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection, transaction
+    from submission.models import Submission
+
+    check_database(connection)
+    index_names = [index.name for index in Submission._meta.indexes] + SEARCH_INDEXES
+    queries = build_queries()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            cursor.execute(SEED_SQL, [args.rows])
+            cursor.execute("ANALYZE submission")
+            print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s\n")
+
+            print("with indexes")
+            with_indexes = run_queries(queries, args.limit, args.verbose)
+            for name in index_names:
+                cursor.execute(f"DROP INDEX {name}")
+            cursor.execute("ANALYZE submission")
+            print("\nwithout indexes")
+            without_indexes = run_queries(queries, args.limit, args.verbose)
+        transaction.set_rollback(True)
+
+    print(f"\n{'query':<28}{'without':>12}{'with':>12}")
+    for name, _ in queries:
+        print(f"{name:<28}{without_indexes[name]:>10.2f}ms{with_indexes[name]:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ConfConfig(AppConfig):
+    name = "conf"
+
+    def ready(self):
+        from . import signals  # noqa
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from problem.models import Problem
+from quiz.models import Quiz
+from .test_case_index import TestCaseIndex
+
+
+def remember_test_case_id(sender, instance, **kwargs):
+    # 不要直接访问 instance.test_case_id, 在 only()/defer() 的查询中会触发额外的 sql
+    instance._original_test_case_id = instance.__dict__.get("test_case_id")
+
+
+def update_test_case_refs(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and "test_case_id" not in update_fields:
+        return
+    test_case_id = instance.__dict__.get("test_case_id")
+    original_test_case_id = getattr(instance, "_original_test_case_id", None)
+    instance._original_test_case_id = test_case_id
+    if not test_case_id or (not created and test_case_id == original_test_case_id):
+        return
+    if original_test_case_id and original_test_case_id != test_case_id:
+        ids = [test_case_id, original_test_case_id]
+    else:
+        ids = [test_case_id]
+    transaction.on_commit(lambda: TestCaseIndex.refresh_refs(ids))
+
+
+def release_test_case_ref(sender, instance, **kwargs):
+    test_case_id = instance.__dict__.get("test_case_id")
+    if test_case_id:
+        transaction.on_commit(lambda: TestCaseIndex.refresh_refs([test_case_id]))
+
+
+for model in (Problem, Quiz):
+    post_init.connect(remember_test_case_id, sender=model)
+    post_save.connect(update_test_case_refs, sender=model)
+    post_delete.connect(release_test_case_ref, sender=model)
@@ -0,0 +1,16 @@
+import dramatiq
+
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.shortcuts import DRAMATIQ_WORKER_ARGS
+from .test_case_index import TestCaseIndex
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def prune_test_case(test_case_ids):
+    key = CacheKey.test_case_prune_progress
+    cache.hset(key, mapping={"status": "running", "total": len(test_case_ids), "deleted": 0})
+    for test_case_id in test_case_ids:
+        if TestCaseIndex.delete_orphan(test_case_id):
+            cache.hincrby(key, "deleted")
+    cache.hset(key, "status", "finished")
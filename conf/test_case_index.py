@@ -0,0 +1,109 @@
+import os
+import re
+import shutil
+
+from django.conf import settings
+
+from problem.models import Problem
+from quiz.models import Quiz
+from utils.cache import cache
+from utils.constants import CacheKey
+
+TEST_CASE_ID_RE = re.compile(r"^[a-zA-Z0-9]{32}$")
+
+
+class TestCaseIndex(object):
+    """
+    test case 目录的引用索引, 保存在 redis 中
+     - CacheKey.test_case_dirs: 磁盘上存在的 test case 目录, 创建和删除目录时维护
+     - CacheKey.test_case_refs: 被 Problem 或 Quiz 引用的 test case 目录, 由 conf.signals 维护
+    孤立的 test case 即两者的差集, 不需要再扫描整个 TEST_CASE_DIR
+    """
+    @staticmethod
+    def _decode(ids):
+        return [item.decode("utf-8") if isinstance(item, bytes) else item for item in ids]
+
+    @staticmethod
+    def is_built():
+        return bool(cache.exists(CacheKey.test_case_index_built))
+
+    @staticmethod
+    def rebuild():
+        disk_ids = [item for item in os.listdir(settings.TEST_CASE_DIR) if TEST_CASE_ID_RE.match(item)]
+        db_ids = set(Problem.objects.values_list("test_case_id", flat=True).distinct())
+        db_ids.update(Quiz.objects.values_list("test_case_id", flat=True).distinct())
+        db_ids.discard(None)
+
+        pipe = cache.pipeline()
+        for key, ids in [(CacheKey.test_case_dirs, disk_ids), (CacheKey.test_case_refs, db_ids)]:
+            # 先写临时 key 再 rename, 重建过程中不会读到不完整的索引
+            tmp_key = f"{key}:rebuilding"
+            pipe.delete(tmp_key)
+            if ids:
+                pipe.sadd(tmp_key, *ids)
+                pipe.rename(tmp_key, key)
+            else:
+                pipe.delete(key)
+        pipe.set(CacheKey.test_case_index_built, 1)
+        pipe.execute()
+
+    @staticmethod
+    def add_dir(test_case_id):
+        cache.sadd(CacheKey.test_case_dirs, test_case_id)
+
+    @staticmethod
+    def remove_dir(test_case_id):
+        cache.srem(CacheKey.test_case_dirs, test_case_id)
+
+    @staticmethod
+    def is_referenced(test_case_id):
+        return Problem.objects.filter(test_case_id=test_case_id).exists() or \
+            Quiz.objects.filter(test_case_id=test_case_id).exists()
+
+    @classmethod
+    def refresh_refs(cls, test_case_ids):
+        """
+        重新计算给定 test case 的引用状态, 多个题目可能共用同一个 test case, 所以不能直接删除
+        """
+        for test_case_id in test_case_ids:
+            if cls.is_referenced(test_case_id):
+                cache.sadd(CacheKey.test_case_refs, test_case_id)
+            else:
+                cache.srem(CacheKey.test_case_refs, test_case_id)
+
+    @classmethod
+    def orphan_ids(cls):
+        if not cls.is_built():
+            cls.rebuild()
+        return cls._decode(cache.sdiff(CacheKey.test_case_dirs, CacheKey.test_case_refs))
+
+    @classmethod
+    def delete_dir(cls, test_case_id):
+        test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
+        if os.path.isdir(test_case_dir):
+            shutil.rmtree(test_case_dir, ignore_errors=True)
+        cls.remove_dir(test_case_id)
+
+    @classmethod
+    def delete_orphan(cls, test_case_id):
+        """
+        删除之前再确认一次没有被引用, 索引生成之后可能有新的题目使用了这个 test case
+        """
+        if cache.sismember(CacheKey.test_case_refs, test_case_id) or cls.is_referenced(test_case_id):
+            return False
+        cls.delete_dir(test_case_id)
+        return True
+
+    @staticmethod
+    def init_prune_progress(total):
+        cache.hset(CacheKey.test_case_prune_progress, mapping={"status": "pending", "total": total, "deleted": 0})
+
+    @staticmethod
+    def get_prune_progress():
+        progress = cache.hgetall(CacheKey.test_case_prune_progress)
+        if not progress:
+            return None
+        progress = {k.decode("utf-8"): v.decode("utf-8") for k, v in progress.items()}
+        progress["total"] = int(progress["total"])
+        progress["deleted"] = int(progress["deleted"])
+        return progress
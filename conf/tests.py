@@ -7,6 +7,7 @@ from django.utils import timezone
 from options.options import SysOptions
 from utils.api.tests import APITestCase
 from .models import JudgeServer
+from .test_case_index import TestCaseIndex
 
 
 class SMTPConfigTest(APITestCase):
@@ -144,16 +145,45 @@ class TestCasePruneAPITest(APITestCase):
         resp = self.client.get(self.url)
         self.assertSuccess(resp)
 
-    @mock.patch("conf.views.TestCasePruneAPI.delete_one")
-    @mock.patch("conf.views.os.listdir")
-    @mock.patch("conf.views.Problem")
-    def test_delete_test_case(self, mocked_problem, mocked_listdir, mocked_delete_one):
+    @mock.patch("conf.views.prune_test_case.send")
+    @mock.patch("conf.views.TestCaseIndex.orphan_ids")
+    def test_delete_test_case(self, mocked_orphan_ids, mocked_send):
         valid_id = "1172980672983b2b49820be3a741b109"
-        mocked_problem.return_value = [valid_id, ]
-        mocked_listdir.return_value = [valid_id, ".test", "aaa"]
+        mocked_orphan_ids.return_value = [valid_id, ]
         resp = self.client.delete(self.url)
         self.assertSuccess(resp)
-        mocked_delete_one.assert_called_once_with(valid_id)
+        self.assertEqual(resp.data["data"], {"total": 1})
+        mocked_send.assert_called_once_with([valid_id])
+
+    def test_get_prune_progress(self):
+        TestCaseIndex.init_prune_progress(3)
+        resp = self.client.get(self.url, data={"progress": "1"})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"], {"status": "pending", "total": 3, "deleted": 0})
+
+
+class TestCaseIndexTest(APITestCase):
+    def setUp(self):
+        self.referenced_id = "1172980672983b2b49820be3a741b109"
+        self.orphan_id = "2172980672983b2b49820be3a741b109"
+        TestCaseIndex.rebuild()
+
+    @mock.patch("conf.test_case_index.TestCaseIndex.is_referenced")
+    def test_orphan_ids(self, mocked_is_referenced):
+        mocked_is_referenced.side_effect = lambda test_case_id: test_case_id == self.referenced_id
+        TestCaseIndex.add_dir(self.referenced_id)
+        TestCaseIndex.add_dir(self.orphan_id)
+        TestCaseIndex.refresh_refs([self.referenced_id, self.orphan_id])
+        orphan_ids = TestCaseIndex.orphan_ids()
+        self.assertIn(self.orphan_id, orphan_ids)
+        self.assertNotIn(self.referenced_id, orphan_ids)
+
+        TestCaseIndex.remove_dir(self.orphan_id)
+        self.assertNotIn(self.orphan_id, TestCaseIndex.orphan_ids())
+
+    def tearDown(self):
+        TestCaseIndex.rebuild()
+        super().tearDown()
 
 
 class ReleaseNoteAPITest(APITestCase):
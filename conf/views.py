@@ -1,8 +1,6 @@
 import hashlib
 import json
 import os
-import re
-import shutil
 import smtplib
 import time
 from datetime import datetime
@@ -18,13 +16,13 @@ from account.models import User
 from contest.models import Contest
 from judge.dispatcher import process_pending_task
 from options.options import SysOptions
-from problem.models import Problem
-from quiz.models import Quiz
 from submission.models import Submission
 from utils.api import APIView, CSRFExemptAPIView, validate_serializer
 from utils.shortcuts import send_email, get_env
 from utils.xss_filter import XSSHtml
 from .models import JudgeServer
+from .tasks import prune_test_case
+from .test_case_index import TestCaseIndex, TEST_CASE_ID_RE
 from .serializers import (CreateEditWebsiteConfigSerializer,
                           CreateSMTPConfigSerializer, EditSMTPConfigSerializer,
                           JudgeServerHeartbeatSerializer,
@@ -90,19 +88,18 @@ class SMTPTestAPI(APIView):
 
 class WebsiteConfigAPI(APIView):
     def get(self, request):
-        ret = {key: getattr(SysOptions, key) for key in
-               ["website_base_url", "website_name", "website_name_shortcut",
-                "website_footer", "allow_register", "submission_list_show_all"]}
+        ret = SysOptions.get_options(["website_base_url", "website_name", "website_name_shortcut",
+                                      "website_footer", "allow_register", "submission_list_show_all"])
         return self.success(ret)
 
     @super_admin_required
     @validate_serializer(CreateEditWebsiteConfigSerializer)
     def post(self, request):
-        for k, v in request.data.items():
-            if k == "website_footer":
-                with XSSHtml() as parser:
-                    v = parser.clean(v)
-            setattr(SysOptions, k, v)
+        options = dict(request.data)
+        if "website_footer" in options:
+            with XSSHtml() as parser:
+                options["website_footer"] = parser.clean(options["website_footer"])
+        SysOptions.set_options(options)
         return self.success()
 
 
@@ -173,15 +170,18 @@ class TestCasePruneAPI(APIView):
     @super_admin_required
     def get(self, request):
         """
-        return orphan test_case list
+        return orphan test_case list, or the progress of the running prune job if `progress` is given
         """
+        if request.GET.get("progress"):
+            return self.success(TestCaseIndex.get_prune_progress())
         ret_data = []
-        dir_to_be_removed = self.get_orphan_ids()
-
-        # return an iterator
-        for d in os.scandir(settings.TEST_CASE_DIR):
-            if d.name in dir_to_be_removed:
-                ret_data.append({"id": d.name, "create_time": d.stat().st_mtime})
+        for id in TestCaseIndex.orphan_ids():
+            try:
+                create_time = os.stat(os.path.join(settings.TEST_CASE_DIR, id)).st_mtime
+            except FileNotFoundError:
+                TestCaseIndex.remove_dir(id)
+                continue
+            ret_data.append({"id": id, "create_time": create_time})
         return self.success(ret_data)
 
     @super_admin_required
@@ -190,23 +190,19 @@ class TestCasePruneAPI(APIView):
         if test_case_id:
             self.delete_one(test_case_id)
             return self.success()
-        for id in self.get_orphan_ids():
-            self.delete_one(id)
-        return self.success()
+        orphan_ids = self.get_orphan_ids()
+        TestCaseIndex.init_prune_progress(len(orphan_ids))
+        prune_test_case.send(orphan_ids)
+        return self.success({"total": len(orphan_ids)})
 
     @staticmethod
     def get_orphan_ids():
-        db_ids = Problem.objects.all().values_list("test_case_id", flat=True)
-        disk_ids = os.listdir(settings.TEST_CASE_DIR)
-        test_case_re = re.compile(r"^[a-zA-Z0-9]{32}$")
-        disk_ids = filter(lambda f: test_case_re.match(f), disk_ids)
-        return list(set(disk_ids) - set(db_ids))
+        return TestCaseIndex.orphan_ids()
 
     @staticmethod
     def delete_one(id):
-        test_case_dir = os.path.join(settings.TEST_CASE_DIR, id)
-        if os.path.isdir(test_case_dir):
-            shutil.rmtree(test_case_dir, ignore_errors=True)
+        if TEST_CASE_ID_RE.match(id):
+            TestCaseIndex.delete_dir(id)
 
 
 class ReleaseNotesAPI(APIView):
@@ -59,6 +59,9 @@ n=0
 while [ $n -lt 5 ]
 do
     python manage.py migrate --no-input &&
+    python manage.py submission_partitions &&
+    python manage.py copy_user_sessions &&
+    python manage.py rebuild_user_rank &&
     python manage.py inituser --username=root --password=rootroot --action=create_super_admin &&
     echo "from options.options import SysOptions; SysOptions.judge_server_token='$JUDGE_SERVER_TOKEN'" | python manage.py shell &&
     echo "from conf.models import JudgeServer; JudgeServer.objects.update(task_number=0)" | python manage.py shell &&
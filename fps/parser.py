@@ -8,8 +8,92 @@ import json
 import os
 import xml.etree.ElementTree as ET
 
+from utils.shortcuts import rand_str
 
-class FPSParser(object):
+
+class FPSItemParser(object):
+    """
+    解析 FPS 中一道题目(item 节点)的各个子节点, 由 FPSParser 和 FPSStreamParser 共用
+    """
+    @staticmethod
+    def _new_problem():
+        return {"title": "No Title", "description": "No Description",
+                "input": "No Input Description",
+                "output": "No Output Description",
+                "memory_limit": {"unit": None, "value": None},
+                "time_limit": {"unit": None, "value": None},
+                "samples": [], "images": [], "append": [],
+                "template": [], "prepend": [], "test_cases": [],
+                "hint": None, "source": None, "spj": None, "solution": []}
+
+    def _parse_problem_item(self, problem, item, state):
+        tag = item.tag
+        if tag in ["title", "description", "input", "output", "hint", "source"]:
+            problem[item.tag] = item.text
+        elif tag == "time_limit":
+            unit = item.attrib.get("unit", "s")
+            if unit not in ["s", "ms"]:
+                raise ValueError("Invalid time limit unit")
+            problem["time_limit"]["unit"] = item.attrib.get("unit", "s")
+            value = int(item.text)
+            if value <= 0:
+                raise ValueError("Invalid time limit value")
+            problem["time_limit"]["value"] = value
+        elif tag == "memory_limit":
+            unit = item.attrib.get("unit", "MB")
+            if unit not in ["MB", "KB", "mb", "kb"]:
+                raise ValueError("Invalid memory limit unit")
+            problem["memory_limit"]["unit"] = unit.upper()
+            value = int(item.text)
+            if value <= 0:
+                raise ValueError("Invalid memory limit value")
+            problem["memory_limit"]["value"] = value
+        elif tag in ["template", "append", "prepend", "solution"]:
+            lang = item.attrib.get("language")
+            if not lang:
+                raise ValueError("Invalid " + tag + ", language name is missed")
+            problem[tag].append({"language": lang, "code": item.text})
+        elif tag == "spj":
+            lang = item.attrib.get("language")
+            if not lang:
+                raise ValueError("Invalid spj, language name if missed")
+            problem["spj"] = {"language": lang, "code": item.text}
+        elif tag == "img":
+            problem["images"].append({"src": None, "blob": None})
+            for child in item:
+                if child.tag == "src":
+                    problem["images"][-1]["src"] = child.text
+                elif child.tag == "base64":
+                    problem["images"][-1]["blob"] = base64.b64decode(child.text)
+        elif tag == "sample_input":
+            if not state["sample_start"]:
+                raise ValueError("Invalid xml, error 'sample_input' tag order")
+            problem["samples"].append({"input": item.text, "output": None})
+            state["sample_start"] = False
+        elif tag == "sample_output":
+            if state["sample_start"]:
+                raise ValueError("Invalid xml, error 'sample_output' tag order")
+            problem["samples"][-1]["output"] = item.text
+            state["sample_start"] = True
+        elif tag == "test_input":
+            if not state["test_case_start"]:
+                raise ValueError("Invalid xml, error 'test_input' tag order")
+            self._add_test_input(problem, item.text)
+            state["test_case_start"] = False
+        elif tag == "test_output":
+            if state["test_case_start"]:
+                raise ValueError("Invalid xml, error 'test_output' tag order")
+            self._add_test_output(problem, item.text)
+            state["test_case_start"] = True
+
+    def _add_test_input(self, problem, content):
+        problem["test_cases"].append({"input": content, "output": None})
+
+    def _add_test_output(self, problem, content):
+        problem["test_cases"][-1]["output"] = content
+
+
+class FPSParser(FPSItemParser):
     def __init__(self, fps_path=None, string_data=None):
         if fps_path:
             self._etree = ET.parse(fps_path).getroot()
@@ -33,87 +117,115 @@ class FPSParser(object):
         return ret
 
     def _parse_one_problem(self, node):
-        sample_start = True
-        test_case_start = True
-        problem = {"title": "No Title", "description": "No Description",
-                   "input": "No Input Description",
-                   "output": "No Output Description",
-                   "memory_limit": {"unit": None, "value": None},
-                   "time_limit": {"unit": None, "value": None},
-                   "samples": [], "images": [], "append": [],
-                   "template": [], "prepend": [], "test_cases": [],
-                   "hint": None, "source": None, "spj": None, "solution": []}
+        problem = self._new_problem()
+        state = {"sample_start": True, "test_case_start": True}
         for item in node:
-            tag = item.tag
-            if tag in ["title", "description", "input", "output", "hint", "source"]:
-                problem[item.tag] = item.text
-            elif tag == "time_limit":
-                unit = item.attrib.get("unit", "s")
-                if unit not in ["s", "ms"]:
-                    raise ValueError("Invalid time limit unit")
-                problem["time_limit"]["unit"] = item.attrib.get("unit", "s")
-                value = int(item.text)
-                if value <= 0:
-                    raise ValueError("Invalid time limit value")
-                problem["time_limit"]["value"] = value
-            elif tag == "memory_limit":
-                unit = item.attrib.get("unit", "MB")
-                if unit not in ["MB", "KB", "mb", "kb"]:
-                    raise ValueError("Invalid memory limit unit")
-                problem["memory_limit"]["unit"] = unit.upper()
-                value = int(item.text)
-                if value <= 0:
-                    raise ValueError("Invalid memory limit value")
-                problem["memory_limit"]["value"] = value
-            elif tag in ["template", "append", "prepend", "solution"]:
-                lang = item.attrib.get("language")
-                if not lang:
-                    raise ValueError("Invalid " + tag + ", language name is missed")
-                problem[tag].append({"language": lang, "code": item.text})
-            elif tag == "spj":
-                lang = item.attrib.get("language")
-                if not lang:
-                    raise ValueError("Invalid spj, language name if missed")
-                problem["spj"] = {"language": lang, "code": item.text}
-            elif tag == "img":
-                problem["images"].append({"src": None, "blob": None})
-                for child in item:
-                    if child.tag == "src":
-                        problem["images"][-1]["src"] = child.text
-                    elif child.tag == "base64":
-                        problem["images"][-1]["blob"] = base64.b64decode(child.text)
-            elif tag == "sample_input":
-                if not sample_start:
-                    raise ValueError("Invalid xml, error 'sample_input' tag order")
-                problem["samples"].append({"input": item.text, "output": None})
-                sample_start = False
-            elif tag == "sample_output":
-                if sample_start:
-                    raise ValueError("Invalid xml, error 'sample_output' tag order")
-                problem["samples"][-1]["output"] = item.text
-                sample_start = True
-            elif tag == "test_input":
-                if not test_case_start:
-                    raise ValueError("Invalid xml, error 'test_input' tag order")
-                problem["test_cases"].append({"input": item.text, "output": None})
-                test_case_start = False
-            elif tag == "test_output":
-                if test_case_start:
-                    raise ValueError("Invalid xml, error 'test_output' tag order")
-                problem["test_cases"][-1]["output"] = item.text
-                test_case_start = True
-
+            self._parse_problem_item(problem, item, state)
         return problem
 
 
+class FPSStreamParser(FPSItemParser):
+    """
+    基于 iterparse 的流式解析, 适用于很大的 FPS 文件
+     - parse() 是一个生成器, 每次只产出一道题目, 处理完的节点会被立即清理
+     - 测试用例在解析过程中直接写入 test_case_base_dir 下的新目录, 不会保存在内存中,
+       产出的题目中 test_case_id 为目录名, test_case_info 为写入的 info 文件内容
+     - test_case_ids 记录所有创建过的目录, 包括解析出错的题目, 导入失败时用于清理
+    """
+    def __init__(self, fps_path, test_case_base_dir):
+        self._fps_path = fps_path
+        self._test_case_base_dir = test_case_base_dir
+        self.test_case_ids = []
+
+    def parse(self):
+        context = ET.iterparse(self._fps_path, events=("start", "end"))
+        root = None
+        depth = 0
+        problem = state = None
+        for event, elem in context:
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = elem
+                    version = root.attrib.get("version", "No Version")
+                    if version not in ["1.1", "1.2"]:
+                        raise ValueError("Unsupported version '" + version + "'")
+                elif depth == 2 and elem.tag == "item":
+                    problem = self._new_problem()
+                    state = {"sample_start": True, "test_case_start": True}
+                    self._create_test_case_dir(problem)
+                continue
+
+            depth -= 1
+            if depth == 2 and problem is not None:
+                # item 的直接子节点, 此时子节点已经完整
+                self._parse_problem_item(problem, elem, state)
+                elem.clear()
+            elif depth == 1:
+                if elem.tag == "item":
+                    problem["test_case_info"] = self._write_test_case_info(problem)
+                    yield problem
+                    problem = state = None
+                root.clear()
+
+    def _create_test_case_dir(self, problem):
+        test_case_id = rand_str()
+        test_case_dir = os.path.join(self._test_case_base_dir, test_case_id)
+        os.mkdir(test_case_dir)
+        self.test_case_ids.append(test_case_id)
+        problem["test_case_id"] = test_case_id
+        problem["test_case_dir"] = test_case_dir
+
+    def _write_test_case_file(self, problem, name, content):
+        content = (content or "").encode("utf-8")
+        with open(os.path.join(problem["test_case_dir"], name), "wb") as f:
+            f.write(content)
+        return content
+
+    def _add_test_input(self, problem, content):
+        index = len(problem["test_cases"]) + 1
+        input_name = f"{index}.in"
+        content = self._write_test_case_file(problem, input_name, content)
+        problem["test_cases"].append({"input_name": input_name, "input_size": len(content)})
+
+    def _add_test_output(self, problem, content):
+        test_case = problem["test_cases"][-1]
+        output_name = f"{len(problem['test_cases'])}.out"
+        content = self._write_test_case_file(problem, output_name, content)
+        test_case.update({"output_name": output_name,
+                          "output_size": len(content),
+                          "stripped_output_md5": hashlib.md5(content.rstrip()).hexdigest()})
+
+    def _write_test_case_info(self, problem):
+        # spj 节点可能出现在测试用例之后, 所以 info 在整道题解析完之后才能确定
+        spj = problem["spj"] is not None
+        test_cases = {}
+        for index, item in enumerate(problem["test_cases"]):
+            if spj:
+                test_cases[str(index + 1)] = {"input_name": item["input_name"], "input_size": item["input_size"]}
+            else:
+                test_cases[str(index + 1)] = item
+        info = {"spj": spj, "test_cases": test_cases}
+        with open(os.path.join(problem["test_case_dir"], "info"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(info, indent=4))
+        return info
+
+
 class FPSHelper(object):
+    def __init__(self):
+        # save_image 保存的图片, 导入失败时用于清理
+        self.image_paths = []
+
     def save_image(self, problem, base_dir, base_url):
-        _problem = copy.deepcopy(problem)
+        # 只会替换 description 等字符串字段, 浅拷贝即可, 避免复制测试用例数据
+        _problem = copy.copy(problem)
         for img in _problem["images"]:
             name = "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(12))
             ext = os.path.splitext(img["src"])[1]
             file_name = name + ext
-            with open(os.path.join(base_dir, file_name), "wb") as f:
+            image_path = os.path.join(base_dir, file_name)
+            self.image_paths.append(image_path)
+            with open(image_path, "wb") as f:
                 f.write(img["blob"])
             for item in ["description", "input", "output"]:
                 _problem[item] = _problem[item].replace(img["src"], os.path.join(base_url, file_name))
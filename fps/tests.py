@@ -0,0 +1,46 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from .parser import FPSParser, FPSStreamParser
+
+FPS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fps.xml")
+
+
+class FPSStreamParserTest(SimpleTestCase):
+    def setUp(self):
+        self.test_case_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_case_dir, ignore_errors=True)
+
+    def test_same_result_as_fps_parser(self):
+        expected = FPSParser(FPS_FILE).parse()
+        problems = list(FPSStreamParser(FPS_FILE, self.test_case_dir).parse())
+        self.assertEqual(len(problems), len(expected))
+        for problem, expected_problem in zip(problems, expected):
+            for key in ["title", "description", "input", "output", "hint", "source", "spj",
+                        "time_limit", "memory_limit", "samples", "template", "prepend", "append", "images"]:
+                self.assertEqual(problem[key], expected_problem[key])
+
+    def test_test_cases_are_written_to_disk(self):
+        expected = FPSParser(FPS_FILE).parse()[0]
+        problem = next(FPSStreamParser(FPS_FILE, self.test_case_dir).parse())
+        test_case_dir = os.path.join(self.test_case_dir, problem["test_case_id"])
+        self.assertEqual(len(problem["test_cases"]), len(expected["test_cases"]))
+        for index, item in enumerate(expected["test_cases"]):
+            with open(os.path.join(test_case_dir, f"{index + 1}.in"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), item["input"])
+        with open(os.path.join(test_case_dir, "info"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), problem["test_case_info"])
+        self.assertEqual(problem["test_case_info"]["spj"], expected["spj"] is not None)
+
+    def test_invalid_version(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?><fps version="0.1"><item></item></fps>')
+            f.flush()
+            with self.assertRaisesMessage(ValueError, "Unsupported version"):
+                list(FPSStreamParser(f.name, self.test_case_dir).parse())
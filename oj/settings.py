@@ -67,6 +67,7 @@ MIDDLEWARE = (
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'account.middleware.APITokenAuthMiddleware',
+    'account.middleware.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -251,4 +252,15 @@ RAVEN_CONFIG = {
 
 IP_HEADER = "HTTP_X_REAL_IP"
 
+# 按路由限流, 由 account.middleware.RateLimitMiddleware 在 view 之前检查
+# key 可以是 user, ip 或 session, 未登录或者没有 session 时使用 ip; window 秒内最多 limit 次
+RATE_LIMITS = [
+    {"path": r"^/api/login/?$", "methods": ["POST"], "key": "ip", "limit": 20, "window": 60},
+    {"path": r"^/api/register/?$", "methods": ["POST"], "key": "ip", "limit": 10, "window": 600},
+    {"path": r"^/api/apply_reset_password/?$", "methods": ["POST"], "key": "ip", "limit": 5, "window": 600},
+    {"path": r"^/api/reset_password/?$", "methods": ["POST"], "key": "ip", "limit": 10, "window": 600},
+    {"path": r"^/api/check_username_or_email", "methods": ["POST"], "key": "ip", "limit": 60, "window": 60},
+    {"path": r"^/api/captcha/?$", "methods": ["GET"], "key": "session", "limit": 30, "window": 60},
+]
+
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'
\ No newline at end of file
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.9 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('options', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('data', models.BinaryField()),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'compression_dictionary',
+            },
+        ),
+    ]
@@ -5,3 +5,17 @@ from utils.models import JSONField
 class SysOptions(models.Model):
     key = models.TextField(unique=True, db_index=True)
     value = JSONField()
+
+
+class CompressionDictionary(models.Model):
+    """
+    utils.compression 使用的 zstd 字典, 删除后使用它压缩的数据无法解压
+    """
+    # zstd frame 中的 dict_id
+    id = models.BigIntegerField(primary_key=True)
+    name = models.TextField()
+    data = models.BinaryField()
+    create_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "compression_dictionary"
@@ -1,14 +1,20 @@
+import copy
 import functools
+import logging
 import os
 import threading
 import time
 
-from django.db import transaction, IntegrityError
+from django.db import transaction
 
+from utils.cache import cache
+from utils.constants import CacheKey
 from utils.shortcuts import rand_str
 from judge.languages import languages
 from .models import SysOptions as SysOptionsModel
 
+logger = logging.getLogger(__name__)
+
 
 class my_property:
     """
@@ -84,7 +90,87 @@ class my_property:
         return self
 
 
-DEFAULT_SHORT_TTL = 2
+class _OptionsCache:
+    """
+    进程内的全部配置缓存
+     - 一次查询加载所有配置, 并记录加载时 redis 中的版本号
+     - 修改配置时版本号加一, 并通过 redis pub/sub 通知所有进程, 收到通知后下次读取时重新加载, 不需要定时查询数据库
+     - 订阅断开重连之后可能错过了通知, 所以每次(重新)订阅时都会使缓存失效
+     - 每隔 version_check_interval 秒比较一次 redis 中的版本号, 其他情况下错过通知也只会延迟这么久
+    """
+    listen_timeout = 30
+    version_check_interval = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._options = None
+        self.version = None
+        # 收到的失效通知次数, 加载前记录一次, 如果加载完成时又有新的通知, 缓存依然是过期的
+        self._invalidations = 0
+        self._loaded_invalidations = -1
+        self._listener_pid = None
+        self._checked_at = 0
+
+    def _ensure_listener(self):
+        # 每个进程(包括 fork 出来的 worker)都需要自己的订阅线程
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            threading.Thread(target=self._listen, name="sys-options-listener", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = cache.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CacheKey.options_channel)
+                self.invalidate()
+                while True:
+                    message = pubsub.get_message(timeout=self.listen_timeout)
+                    if message is None:
+                        # 定期 ping, 连接断开时抛出异常并重新订阅
+                        pubsub.ping()
+                    elif message["type"] == "message":
+                        self.invalidate()
+            except Exception as e:
+                logger.exception(e)
+                time.sleep(1)
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidations += 1
+
+    def _version_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.version_check_interval:
+            return False
+        self._checked_at = now
+        return cache.get(CacheKey.options_version) != self.version
+
+    def get_all(self):
+        self._ensure_listener()
+        options = self._options
+        if options is not None and self._loaded_invalidations == self._invalidations and not self._version_changed():
+            return options
+        invalidations = self._invalidations
+        version = cache.get(CacheKey.options_version)
+        options = dict(SysOptionsModel.objects.values_list("key", "value"))
+        with self._lock:
+            self._options = options
+            self.version = version
+            self._loaded_invalidations = invalidations
+            self._checked_at = time.monotonic()
+        return options
+
+    def publish(self):
+        version = cache.redis_incr(CacheKey.options_version)
+        cache.publish(CacheKey.options_channel, version)
+
+
+_options_cache = _OptionsCache()
 
 
 def default_token():
@@ -126,36 +212,37 @@ class _SysOptionsMeta(type):
 
     @classmethod
     def _init_option(mcs):
-        for item in mcs._get_keys():
-            if not SysOptionsModel.objects.filter(key=item).exists():
+        keys = mcs._get_keys()
+        exists = set(SysOptionsModel.objects.filter(key__in=keys).values_list("key", flat=True))
+        options = []
+        for item in keys:
+            if item not in exists:
                 default_value = getattr(OptionDefaultValue, item)
                 if callable(default_value):
                     default_value = default_value()
-                try:
-                    SysOptionsModel.objects.create(key=item, value=default_value)
-                except IntegrityError:
-                    pass
+                options.append(SysOptionsModel(key=item, value=default_value))
+        if options:
+            # 其他进程可能同时在初始化, 已经存在的 key 直接忽略
+            SysOptionsModel.objects.bulk_create(options, ignore_conflicts=True)
+            mcs._options_changed()
+
+    @staticmethod
+    def _options_changed():
+        # 当前进程立即失效, 其他进程在事务提交之后通过 pub/sub 得到通知
+        _options_cache.invalidate()
+        transaction.on_commit(_options_cache.publish)
+
+    @classmethod
+    def invalidate_cache(mcs):
+        _options_cache.invalidate()
 
     @classmethod
     def _get_option(mcs, option_key):
-        try:
-            option = SysOptionsModel.objects.get(key=option_key)
-            value = option.value
-            return value
-        except SysOptionsModel.DoesNotExist:
-            mcs._init_option()
-            return mcs._get_option(option_key)
+        return mcs.get_options([option_key])[option_key]
 
     @classmethod
     def _set_option(mcs, option_key: str, option_value):
-        try:
-            with transaction.atomic():
-                option = SysOptionsModel.objects.select_for_update().get(key=option_key)
-                option.value = option_value
-                option.save()
-        except SysOptionsModel.DoesNotExist:
-            mcs._init_option()
-            mcs._set_option(option_key, option_value)
+        mcs.set_options([(option_key, option_value)])
 
     @classmethod
     def _increment(mcs, option_key):
@@ -168,20 +255,34 @@ class _SysOptionsMeta(type):
         except SysOptionsModel.DoesNotExist:
             mcs._init_option()
             return mcs._increment(option_key)
+        mcs._options_changed()
+        return value
 
     @classmethod
     def set_options(mcs, options):
-        for key, value in options:
-            mcs._set_option(key, value)
+        """
+        options 可以是 dict 或者 (key, value) 列表, 在同一个事务中更新, 只通知一次
+        """
+        options = dict(options)
+        if any(key not in _options_cache.get_all() for key in options):
+            mcs._init_option()
+        with transaction.atomic():
+            items = list(SysOptionsModel.objects.select_for_update().filter(key__in=list(options)))
+            for item in items:
+                item.value = options[item.key]
+            SysOptionsModel.objects.bulk_update(items, ["value"])
+        mcs._options_changed()
 
     @classmethod
     def get_options(mcs, keys):
-        result = {}
-        for key in keys:
-            result[key] = mcs._get_option(key)
-        return result
+        options = _options_cache.get_all()
+        if any(key not in options for key in keys):
+            mcs._init_option()
+            options = _options_cache.get_all()
+        # 缓存在线程之间共享, 返回副本以免调用方修改缓存中的 dict 或 list
+        return {key: copy.deepcopy(options[key]) for key in keys}
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_base_url(cls):
         return cls._get_option(OptionKeys.website_base_url)
 
@@ -189,7 +290,7 @@ class _SysOptionsMeta(type):
     def website_base_url(cls, value):
         cls._set_option(OptionKeys.website_base_url, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_name(cls):
         return cls._get_option(OptionKeys.website_name)
 
@@ -197,7 +298,7 @@ class _SysOptionsMeta(type):
     def website_name(cls, value):
         cls._set_option(OptionKeys.website_name, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_name_shortcut(cls):
         return cls._get_option(OptionKeys.website_name_shortcut)
 
@@ -205,7 +306,7 @@ class _SysOptionsMeta(type):
     def website_name_shortcut(cls, value):
         cls._set_option(OptionKeys.website_name_shortcut, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def website_footer(cls):
         return cls._get_option(OptionKeys.website_footer)
 
@@ -221,7 +322,7 @@ class _SysOptionsMeta(type):
     def allow_register(cls, value):
         cls._set_option(OptionKeys.allow_register, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def submission_list_show_all(cls):
         return cls._get_option(OptionKeys.submission_list_show_all)
 
@@ -253,7 +354,7 @@ class _SysOptionsMeta(type):
     def throttling(cls, value):
         cls._set_option(OptionKeys.throttling, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def languages(cls):
         return cls._get_option(OptionKeys.languages)
 
@@ -261,15 +362,15 @@ class _SysOptionsMeta(type):
     def languages(cls, value):
         cls._set_option(OptionKeys.languages, value)
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def spj_languages(cls):
         return [item for item in cls.languages if "spj" in item]
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def language_names(cls):
         return [item["name"] for item in cls.languages]
 
-    @my_property(ttl=DEFAULT_SHORT_TTL)
+    @my_property
     def spj_language_names(cls):
         return [item["name"] for item in cls.languages if "spj" in item]
 
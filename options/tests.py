@@ -1 +1,62 @@
-# Create your tests here.
+from unittest import mock
+
+from utils.api.tests import APITestCase
+from utils.cache import cache
+from utils.constants import CacheKey
+
+from .models import SysOptions as SysOptionsModel
+from .options import SysOptions, OptionKeys
+
+
+class SysOptionsCacheTest(APITestCase):
+    def test_read_from_process_cache(self):
+        SysOptions.website_name
+        with self.assertNumQueries(0):
+            self.assertTrue(SysOptions.website_name)
+            self.assertTrue(SysOptions.languages)
+
+    def test_set_option_invalidates_cache(self):
+        SysOptions.website_name = "test oj"
+        self.assertEqual(SysOptions.website_name, "test oj")
+
+    def test_invalidation_reloads_from_db(self):
+        SysOptions.website_name
+        SysOptionsModel.objects.filter(key=OptionKeys.website_name).update(value="changed by another process")
+        self.assertNotEqual(SysOptions.website_name, "changed by another process")
+        SysOptions.invalidate_cache()
+        self.assertEqual(SysOptions.website_name, "changed by another process")
+
+    @mock.patch("options.options._OptionsCache.version_check_interval", 0)
+    def test_version_change_reloads_from_db(self):
+        # 错过了 pub/sub 通知, 比较版本号之后重新加载
+        SysOptions.website_name
+        SysOptionsModel.objects.filter(key=OptionKeys.website_name).update(value="changed by another process")
+        cache.redis_incr(CacheKey.options_version)
+        self.assertEqual(SysOptions.website_name, "changed by another process")
+
+    def test_returned_value_is_a_copy(self):
+        SysOptions.smtp_config = {"server": "smtp.example.com", "password": "secret"}
+        smtp_config = SysOptions.smtp_config
+        smtp_config.pop("password")
+        self.assertEqual(SysOptions.smtp_config["password"], "secret")
+
+    @mock.patch("options.options._options_cache.publish")
+    def test_publish_after_commit(self, mocked_publish):
+        SysOptions.website_footer
+        with self.captureOnCommitCallbacks(execute=True):
+            SysOptions.website_footer = "footer"
+        mocked_publish.assert_called_once_with()
+
+    def test_bulk_init(self):
+        SysOptionsModel.objects.all().delete()
+        SysOptions.invalidate_cache()
+        # 加载全部配置, 查询已存在的 key, bulk_create, 重新加载
+        with self.assertNumQueries(4):
+            SysOptions.get_options(SysOptions._get_keys())
+        self.assertEqual(SysOptionsModel.objects.count(), len(SysOptions._get_keys()))
+
+    def test_bulk_get_and_set(self):
+        SysOptions.set_options({OptionKeys.website_name: "bulk oj", OptionKeys.allow_register: False})
+        with self.assertNumQueries(1):
+            options = SysOptions.get_options([OptionKeys.website_name, OptionKeys.allow_register])
+        self.assertEqual(options, {OptionKeys.website_name: "bulk oj", OptionKeys.allow_register: False})
@@ -0,0 +1,104 @@
+import hashlib
+import json
+
+from django.db import transaction
+
+from utils.cache import PickCache, cache
+from utils.constants import CacheKey
+from .models import Problem
+
+# 判题时更新的字段, 修改时不清除缓存, 读取缓存之后再从数据库覆盖
+COUNTER_FIELDS = ("submission_number", "accepted_number", "statistic_info")
+
+
+def add_counters(problems):
+    """
+    problems 是序列化之后的题目, 用一次主键查询覆盖其中的提交数和通过数
+    """
+    if not problems:
+        return
+    fields = [field for field in COUNTER_FIELDS if field in problems[0]]
+    if not fields:
+        return
+    counters = {item["id"]: item for item in Problem.objects.filter(id__in=[problem["id"] for problem in problems])
+                .values("id", *fields)}
+    for problem in problems:
+        problem.update(counters.get(problem["id"], {}))
+
+
+class ProblemListCache(object):
+    """
+    公开题目列表每一页的缓存, 和用户无关, my_status 在读取缓存之后添加
+     - key 中包含版本号, 公开题目被修改时版本号加一, 旧版本的缓存不再使用, 等待过期
+     - 只修改 COUNTER_FIELDS 时不改变版本号
+    """
+    ttl = 3600
+
+    @staticmethod
+    def _key(version, params):
+        digest = hashlib.md5(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{CacheKey.problem_list}:{version}:{digest}"
+
+    @classmethod
+    def get_page(cls, params, build):
+        """
+        :param params: 决定这一页内容的请求参数
+        :param build: 没有缓存时调用, 返回这一页的数据
+        """
+        key = cls._key(cache.get(CacheKey.problem_list_version) or 0, params)
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, timeout=cls.ttl)
+        return data
+
+    @classmethod
+    def invalidate(cls):
+        cache.redis_incr(CacheKey.problem_list_version)
+        # 事务提交前其他请求可能又缓存了旧的数据
+        transaction.on_commit(lambda: cache.redis_incr(CacheKey.problem_list_version))
+
+
+class ProblemDetailCache(object):
+    """
+    题目详情序列化之后的缓存, 公开题目和比赛题目, 不同的 serializer 分别缓存
+     - 题目被修改或删除时由 problem.signals 清除, 修改 _id 时原来的 key 也会清除
+     - COUNTER_FIELDS 不在缓存中更新, 由 add_counters 覆盖
+    """
+    ttl = 3600
+    serializer_names = ("ProblemSerializer", "ProblemSafeSerializer")
+
+    @staticmethod
+    def _key(contest_id, display_id, serializer_name):
+        return f"{CacheKey.problem_detail}:{contest_id or 0}:{serializer_name}:{display_id}"
+
+    @classmethod
+    def get(cls, query_set, contest_id, display_id, serializer_class):
+        """
+        query_set 中不存在时抛出 Problem.DoesNotExist
+        """
+        key = cls._key(contest_id, display_id, serializer_class.__name__)
+        data = cache.get(key)
+        if data is None:
+            data = dict(serializer_class(query_set.get(_id=display_id)).data)
+            cache.set(key, data, timeout=cls.ttl)
+        add_counters([data])
+        return data
+
+    @classmethod
+    def invalidate(cls, contest_id, *display_ids):
+        keys = [cls._key(contest_id, display_id, name) for display_id in set(display_ids) if display_id
+                for name in cls.serializer_names]
+        if keys:
+            cache.delete_many(keys)
+            transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class ProblemPickCache(PickCache):
+    """
+    和 ProblemListCache 使用同一个版本号, 公开题目被修改时一起失效
+    """
+    model = Problem
+    key = CacheKey.problem_pick
+    version_key = CacheKey.problem_list_version
+    ttl = ProblemListCache.ttl
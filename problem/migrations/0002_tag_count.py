@@ -0,0 +1,31 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:36
+
+from django.db import migrations, models
+
+# 已有标签的 problem_count, 之后由 problem.signals 维护
+COUNT_SQL = """
+UPDATE problem_tag SET problem_count = (
+    SELECT COUNT(*) FROM problem_tags JOIN problem ON problem.id = problem_tags.problem_id
+    WHERE problem_tags.problemtag_id = problem_tag.id AND problem.visible AND problem.contest_id IS NULL
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problem', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problemtag',
+            name='problem_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(COUNT_SQL, migrations.RunSQL.noop),
+        # 标签搜索使用 istartswith, 生成的是 UPPER("name"::text) LIKE UPPER(...)
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS problem_tag_name_prefix_idx ON "problem_tag" (UPPER("name"::text) text_pattern_ops)',
+            "DROP INDEX IF EXISTS problem_tag_name_prefix_idx"),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# 和 problem.search.UPDATE_SQL 相同, 复制到迁移中, 之后修改 problem.search 不会影响这个迁移
+UPDATE_SQL = """
+UPDATE problem SET search_vector =
+    setweight(to_tsvector('simple', regexp_replace(problem._id || ' ' || problem.title, '[[:punct:]]+', ' ', 'g')), 'A') ||
+    setweight(to_tsvector('simple', regexp_replace(coalesce(tags.names, ''), '[[:punct:]]+', ' ', 'g')), 'B') ||
+    setweight(to_tsvector('simple', regexp_replace(regexp_replace(problem.description, '<[^>]*>|&[a-z]+;', ' ', 'g'),
+                                                   '[[:punct:]]+', ' ', 'g')), 'C')
+FROM (
+    SELECT problem.id, string_agg(problem_tag.name, ' ') AS names FROM problem
+    LEFT JOIN problem_tags ON problem_tags.problem_id = problem.id
+    LEFT JOIN problem_tag ON problem_tag.id = problem_tags.problemtag_id
+    GROUP BY problem.id
+) AS tags
+WHERE tags.id = problem.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problem', '0002_tag_count'),
+        # pg_trgm
+        ('account', '0004_username_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        # 先生成 search_vector 再建索引
+        migrations.RunSQL(UPDATE_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='problem',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='problem_search_vector_idx'),
+        ),
+        # 关键词中有中文时使用 title__icontains
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS problem_title_trgm_idx ON "problem" USING gin (UPPER("title"::text) gin_trgm_ops)',
+            "DROP INDEX IF EXISTS problem_title_trgm_idx"),
+    ]
@@ -1,4 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from utils.models import JSONField
 
 from account.models import User
@@ -9,6 +13,18 @@ from utils.constants import Choices
 
 class ProblemTag(models.Model):
     name = models.TextField()
+    # 公开并且可见的题目数量, 由 problem.signals 维护
+    problem_count = models.IntegerField(default=0)
+
+    @classmethod
+    def refresh_problem_count(cls, tag_ids):
+        """
+        重新统计这些标签的 problem_count, 只扫描这些标签在 m2m 表中的行
+        """
+        counts = Problem.tags.through.objects.filter(problemtag_id=OuterRef("pk"), problem__visible=True,
+                                                     problem__contest_id__isnull=True) \
+            .values("problemtag_id").annotate(count=Count("id")).values("count")
+        cls.objects.filter(id__in=tag_ids).update(problem_count=Coalesce(Subquery(counts), 0))
 
     class Meta:
         db_table = "problem_tag"
@@ -81,11 +97,14 @@ class Problem(models.Model):
     # {JudgeStatus.ACCEPTED: 3, JudgeStaus.WRONG_ANSWER: 11}, the number means count
     statistic_info = JSONField(default=dict)
     share_submission = models.BooleanField(default=False)
+    # 全文搜索使用, 由 problem.search.ProblemSearch 维护
+    search_vector = SearchVectorField(null=True)
 
     class Meta:
         db_table = "problem"
         unique_together = (("_id", "contest"),)
         ordering = ("create_time",)
+        indexes = [GinIndex(fields=["search_vector"], name="problem_search_vector_idx")]
 
     def add_submission_number(self):
         self.submission_number = models.F("submission_number") + 1
@@ -0,0 +1,9 @@
+from utils.search import FullTextSearch
+from .models import Problem
+
+
+class ProblemSearch(FullTextSearch):
+    """
+    search_vector 由 problem.signals 在题目保存和标签修改之后更新
+    """
+    model = Problem
@@ -114,7 +114,7 @@ class BaseProblemSerializer(serializers.ModelSerializer):
 class ProblemAdminSerializer(BaseProblemSerializer):
     class Meta:
         model = Problem
-        fields = "__all__"
+        exclude = ("search_vector",)
 
 
 class ProblemSerializer(BaseProblemSerializer):
@@ -123,7 +123,19 @@ class ProblemSerializer(BaseProblemSerializer):
     class Meta:
         model = Problem
         exclude = ("test_case_score", "test_case_id", "visible", "is_public",
-                   "spj_code", "spj_version", "spj_compile_ok")
+                   "spj_code", "spj_version", "spj_compile_ok", "search_vector")
+
+
+class ProblemListSerializer(serializers.ModelSerializer):
+    """
+    题目列表只需要的字段, 不包含题面和模板
+    """
+    tags = serializers.SlugRelatedField(many=True, slug_field="name", read_only=True)
+
+    class Meta:
+        model = Problem
+        fields = ("id", "_id", "title", "difficulty", "tags", "rule_type", "total_score",
+                  "submission_number", "accepted_number")
 
 
 class ProblemSafeSerializer(BaseProblemSerializer):
@@ -133,7 +145,7 @@ class ProblemSafeSerializer(BaseProblemSerializer):
         model = Problem
         exclude = ("test_case_score", "test_case_id", "visible", "is_public",
                    "spj_code", "spj_version", "spj_compile_ok",
-                   "difficulty", "submission_number", "accepted_number", "statistic_info")
+                   "difficulty", "submission_number", "accepted_number", "statistic_info", "search_vector")
 
 
 class ContestProblemMakePublicSerializer(serializers.Serializer):
@@ -0,0 +1,46 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+
+from utils.signals import TaggedModelSignals
+from .cache import COUNTER_FIELDS, ProblemDetailCache, ProblemListCache
+from .models import Problem, ProblemTag
+from .search import ProblemSearch
+
+
+class ProblemSignals(TaggedModelSignals):
+    """
+    ProblemListCache 和 ProblemPickCache 使用同一个版本号, 一起失效
+    """
+    model = Problem
+    search = ProblemSearch
+    cache = ProblemListCache
+    counter_fields = COUNTER_FIELDS
+    refresh_tag_count = staticmethod(ProblemTag.refresh_problem_count)
+
+
+def remember_display_id(sender, instance, **kwargs):
+    # 不要直接访问 instance._id, 在 only()/defer() 的查询中会触发额外的 sql
+    instance._original_display_id = instance.__dict__.get("_id")
+
+
+def invalidate_problem_detail(sender, instance, update_fields=None, **kwargs):
+    # 判题时只更新计数, 不需要清除缓存
+    if ProblemSignals.only_counters(update_fields):
+        return
+    ProblemDetailCache.invalidate(instance.contest_id, instance.__dict__.get("_id"),
+                                  getattr(instance, "_original_display_id", None))
+    instance._original_display_id = instance.__dict__.get("_id")
+
+
+def invalidate_tagged_problem_detail(sender, instance, action, reverse, pk_set=None, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    problems = [instance] if isinstance(instance, Problem) else Problem.objects.filter(id__in=pk_set or [])
+    for problem in problems:
+        ProblemDetailCache.invalidate(problem.contest_id, problem._id)
+
+
+ProblemSignals.connect()
+post_init.connect(remember_display_id, sender=Problem)
+post_save.connect(invalidate_problem_detail, sender=Problem)
+post_delete.connect(invalidate_problem_detail, sender=Problem)
+m2m_changed.connect(invalidate_tagged_problem_detail, sender=Problem.tags.through)
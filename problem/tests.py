@@ -2,10 +2,12 @@ import copy
 import hashlib
 import os
 import shutil
+import tempfile
 from datetime import timedelta
 from zipfile import ZipFile
 
 from django.conf import settings
+from django.test import RequestFactory
 
 from utils.api.tests import APITestCase
 
@@ -13,8 +15,10 @@ from .models import ProblemTag, ProblemIOMode
 from .models import Problem, ProblemRuleType
 from contest.models import Contest
 from contest.tests import DEFAULT_CONTEST_DATA
+from submission.models import JudgeStatus
 
-from .views.admin import TestCaseAPI
+from .cache import ProblemPickCache
+from .views.admin import FPSProblemImport, TestCaseAPI
 from .utils import parse_problem_template
 
 DEFAULT_PROBLEM_DATA = {"_id": "A-110", "title": "test", "description": "<p>test</p>", "input_description": "test",
@@ -66,13 +70,37 @@ class ProblemCreateTestBase(APITestCase):
         return problem
 
 
-class ProblemTagListAPITest(APITestCase):
+class ProblemTagListAPITest(ProblemCreateTestBase):
     def test_get_tag_list(self):
         ProblemTag.objects.create(name="name1")
         ProblemTag.objects.create(name="name2")
         resp = self.client.get(self.reverse("problem_tag_list_api"))
         self.assertSuccess(resp)
 
+    def test_tag_problem_count(self):
+        admin = self.create_admin()
+        problem = self.add_problem(dict(DEFAULT_PROBLEM_DATA, tags=["test", "dp"]), admin)
+        self.add_problem(dict(DEFAULT_PROBLEM_DATA, _id="A-111", tags=["dp"]), admin)
+        url = self.reverse("problem_tag_list_api")
+
+        def counts(keyword=""):
+            return {tag["name"]: tag["problem_count"] for tag in self.client.get(url, {"keyword": keyword}).data["data"]}
+
+        self.assertEqual(counts(), {"test": 1, "dp": 2})
+        self.assertEqual(counts("D"), {"dp": 2})
+
+        problem.visible = False
+        problem.save()
+        self.assertEqual(counts(), {"dp": 1})
+        problem.visible = True
+        problem.save()
+        problem.tags.remove(ProblemTag.objects.get(name="dp"))
+        self.assertEqual(counts(), {"test": 1, "dp": 1})
+        problem.tags.clear()
+        self.assertEqual(counts(), {"dp": 1})
+        Problem.objects.get(_id="A-111").delete()
+        self.assertEqual(counts(), {})
+
 
 class TestCaseUploadAPITest(APITestCase):
     def setUp(self):
@@ -131,6 +159,33 @@ class TestCaseUploadAPITest(APITestCase):
                     self.assertEqual(f.read(), name + "\n" + name + "\n" + "end")
 
 
+class FPSProblemImportTest(APITestCase):
+    def setUp(self):
+        self.user = self.create_super_admin()
+
+    def test_clean_up_on_error(self):
+        item = ('<item><title>{title}</title><description>&lt;img src="a.png"&gt;</description><input>a</input>'
+                '<output>b</output><time_limit unit="s">{time_limit}</time_limit><memory_limit unit="mb">128</memory_limit>'
+                '<img><src>a.png</src><base64>aW1hZ2U=</base64></img>'
+                '<test_input>1</test_input><test_output>2</test_output></item>')
+        fps = f'<?xml version="1.0" encoding="UTF-8"?><fps version="1.2">{item.format(title="a", time_limit=1)}' \
+              f'{item.format(title="b", time_limit=0)}</fps>'
+        test_cases, images = set(os.listdir(settings.TEST_CASE_DIR)), set(os.listdir(settings.UPLOAD_DIR))
+        with tempfile.NamedTemporaryFile("w", suffix=".xml") as f:
+            f.write(fps)
+            f.flush()
+            with open(f.name, "rb") as data:
+                # /api/admin/import_fps 会先匹配到 quiz 的路由, 直接调用 view
+                request = RequestFactory().post("/api/admin/import_fps", data={"file": data})
+            request.user = self.user
+            resp = FPSProblemImport.as_view()(request)
+        self.assertFailed(resp, "Parse FPS file error: Invalid time limit value")
+        # 第一道题已经写入的测试用例和图片都要删除
+        self.assertFalse(Problem.objects.exists())
+        self.assertEqual(set(os.listdir(settings.TEST_CASE_DIR)), test_cases)
+        self.assertEqual(set(os.listdir(settings.UPLOAD_DIR)), images)
+
+
 class ProblemAdminAPITest(APITestCase):
     def setUp(self):
         self.url = self.reverse("problem_admin_api")
@@ -182,16 +237,101 @@ class ProblemAPITest(ProblemCreateTestBase):
         self.url = self.reverse("problem_api")
         admin = self.create_admin(login=False)
         self.problem = self.add_problem(DEFAULT_PROBLEM_DATA, admin)
-        self.create_user("test", "test123")
+        self.user = self.create_user("test", "test123")
 
     def test_get_problem_list(self):
         resp = self.client.get(f"{self.url}?limit=10")
         self.assertSuccess(resp)
 
+    def test_problem_list_cache(self):
+        resp = self.client.get(self.url, data={"limit": 10})
+        self.assertSuccess(resp)
+        item = resp.data["data"]["results"][0]
+        self.assertNotIn("description", item)
+        self.assertEqual((item["title"], item["tags"], item["my_status"]), ("test", ["test"], None))
+
+        # 绕过 signal 修改, 标题仍然来自缓存, 计数来自数据库
+        Problem.objects.filter(id=self.problem.id).update(title="cached", submission_number=10)
+        item = self.client.get(self.url, data={"limit": 10}).data["data"]["results"][0]
+        self.assertEqual((item["title"], item["submission_number"]), ("test", 10))
+
+        self.problem.title = "changed"
+        self.problem.save()
+        item = self.client.get(self.url, data={"limit": 10}).data["data"]["results"][0]
+        self.assertEqual(item["title"], "changed")
+
+    def test_problem_detail_cache(self):
+        resp = self.client.get(self.url, data={"problem_id": self.problem._id})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["title"], "test")
+
+        Problem.objects.filter(id=self.problem.id).update(title="cached", accepted_number=3)
+        data = self.client.get(self.url, data={"problem_id": self.problem._id}).data["data"]
+        self.assertEqual((data["title"], data["accepted_number"]), ("test", 3))
+
+        # 修改 _id 之后原来的缓存也要清除
+        old_id = self.problem._id
+        self.problem._id = "A-111"
+        self.problem.save()
+        self.assertFailed(self.client.get(self.url, data={"problem_id": old_id}))
+        data = self.client.get(self.url, data={"problem_id": "A-111"}).data["data"]
+        self.assertEqual(data["_id"], "A-111")
+
     def get_one_problem(self):
         resp = self.client.get(self.url + "?id=" + self.problem._id)
         self.assertSuccess(resp)
 
+    def test_search(self):
+        admin = self.problem.created_by
+        self.add_problem(dict(DEFAULT_PROBLEM_DATA, _id="A-111", title="shortest path", tags=["graph"]), admin)
+        self.add_problem(dict(DEFAULT_PROBLEM_DATA, _id="A-112", title="other",
+                              description="<p>find the <b>shortest</b> route</p>"), admin)
+        self.add_problem(dict(DEFAULT_PROBLEM_DATA, _id="A-113", title="动态规划入门"), admin)
+
+        def search(keyword, **params):
+            resp = self.client.get(self.url, data={"limit": 1, "keyword": keyword, **params})
+            self.assertSuccess(resp)
+            return resp.data["data"]
+
+        # 标题的权重比描述高
+        data = search("short", cursor="")
+        self.assertEqual(([item["_id"] for item in data["results"]], data["total"]), (["A-111"], 2))
+        data = search("short", cursor=data["next"])
+        self.assertEqual([item["_id"] for item in data["results"]], ["A-112"])
+        self.assertIsNone(data["next"])
+
+        self.assertEqual([item["_id"] for item in search("graph")["results"]], ["A-111"])
+        self.assertEqual([item["_id"] for item in search("a-112")["results"]], ["A-112"])
+        self.assertEqual([item["_id"] for item in search("规划")["results"]], ["A-113"])
+        self.assertEqual(search("!!")["results"], [])
+
+        # 修改标签之后更新索引
+        Problem.objects.get(_id="A-112").tags.add(ProblemTag.objects.get(name="graph"))
+        self.assertEqual(search("graph", limit=10)["total"], 2)
+
+    def test_pick_one(self):
+        url = self.reverse("pick_one_api")
+        problem = self.add_problem(dict(DEFAULT_PROBLEM_DATA, _id="A-111", difficulty="High"), self.problem.created_by)
+        resp = self.client.get(url, data={"difficulty": "High"})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"], "A-111")
+
+        # 不选择已经通过的题目
+        profile = self.user.userprofile
+        profile.acm_problems_status = {"problems": {str(self.problem.id): {"status": JudgeStatus.ACCEPTED,
+                                                                           "_id": self.problem._id}}}
+        profile.save()
+        for _ in range(5):
+            self.assertEqual(self.client.get(url, data={"unsolved": 1}).data["data"], "A-111")
+
+        # 修改可见性之后重新读取
+        problem.visible = False
+        problem.save()
+        self.assertEqual(self.client.get(url).data["data"], self.problem._id)
+        self.assertFailed(self.client.get(url, data={"unsolved": 1}), "No problem to pick")
+        self.assertFailed(self.client.get(url, data={"difficulty": "High"}), "No problem to pick")
+        self.assertIsNone(ProblemPickCache.pick(difficulty="High"))
+
 
 class ContestProblemAdminTest(APITestCase):
     def setUp(self):
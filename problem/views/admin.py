@@ -5,15 +5,16 @@ import os
 import tempfile
 import zipfile
 from wsgiref.util import FileWrapper
+from xml.etree.ElementTree import ParseError
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
 from django.http import StreamingHttpResponse, FileResponse
 
 from account.decorators import problem_permission_required, ensure_created_by
+from conf.test_case_index import TestCaseIndex
 from contest.models import Contest, ContestStatus
-from fps.parser import FPSHelper, FPSParser
+from fps.parser import FPSHelper, FPSStreamParser
 from judge.dispatcher import SPJCompiler
 from options.options import SysOptions
 from submission.models import Submission, JudgeStatus
@@ -22,6 +23,7 @@ from utils.constants import Difficulty
 from utils.shortcuts import rand_str, natural_sort_key
 from utils.tasks import delete_files
 from ..models import Problem, ProblemRuleType, ProblemTag
+from ..search import ProblemSearch
 from ..serializers import (CreateContestProblemSerializer, CompileSPJSerializer,
                            CreateProblemSerializer, EditProblemSerializer, EditContestProblemSerializer,
                            ProblemAdminSerializer, TestCaseUploadForm, ContestProblemMakePublicSerializer,
@@ -46,6 +48,7 @@ class TestCaseZipProcessor(object):
         test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
         os.mkdir(test_case_dir)
         os.chmod(test_case_dir, 0o710)
+        TestCaseIndex.add_dir(test_case_id)
 
         size_cache = {}
         md5_cache = {}
@@ -244,11 +247,12 @@ class ProblemAPI(ProblemBase):
             else:
                 problems = problems.filter(rule_type=rule_type)
 
-        keyword = request.GET.get("keyword", "").strip()
-        if keyword:
-            problems = problems.filter(Q(title__icontains=keyword) | Q(_id__icontains=keyword))
         if not user.can_mgmt_all_problem():
             problems = problems.filter(created_by=user)
+        keyword = request.GET.get("keyword", "").strip()
+        if keyword:
+            problems = ProblemSearch.search(problems, keyword)
+            return self.success(self.paginate_data(request, problems, ProblemAdminSerializer, cursor_ordering=ProblemSearch.ordering))
         return self.success(self.paginate_data(request, problems, ProblemAdminSerializer))
 
     @problem_permission_required
@@ -671,35 +675,44 @@ class FPSProblemImport(CSRFExemptAPIView):
 
     def post(self, request):
         form = UploadProblemForm(request.POST, request.FILES)
-        if form.is_valid():
-            file = form.cleaned_data["file"]
-            with tempfile.NamedTemporaryFile("wb") as tf:
-                for chunk in file.chunks(4096):
-                    tf.file.write(chunk)
-
-                tf.file.flush()
-                os.fsync(tf.file)
-
-                problems = FPSParser(tf.name).parse()
-        else:
+        if not form.is_valid():
             return self.error("Parse upload file error")
+        file = form.cleaned_data["file"]
 
         helper = FPSHelper()
-        with transaction.atomic():
-            for _problem in problems:
-                test_case_id = rand_str()
-                test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-                os.mkdir(test_case_dir)
-                score = []
-                for item in helper.save_test_case(_problem, test_case_dir)["test_cases"].values():
-                    score.append({"score": 0, "input_name": item["input_name"],
-                                  "output_name": item.get("output_name")})
-                problem_data = helper.save_image(_problem, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
-                s = FPSProblemSerializer(data=problem_data)
-                if not s.is_valid():
-                    return self.error(f"Parse FPS file error: {s.errors}")
-                problem_data = s.data
-                problem_data["test_case_id"] = test_case_id
-                problem_data["test_case_score"] = score
-                self._create_problem(problem_data, request.user)
-        return self.success({"import_count": len(problems)})
+        count = 0
+        with tempfile.NamedTemporaryFile("wb") as tf:
+            for chunk in file.chunks(4096):
+                tf.file.write(chunk)
+
+            tf.file.flush()
+            os.fsync(tf.file)
+
+            # 流式解析, 每次只处理一道题, 测试用例在解析时直接写入 TEST_CASE_DIR
+            parser = FPSStreamParser(tf.name, settings.TEST_CASE_DIR)
+            try:
+                with transaction.atomic():
+                    for _problem in parser.parse():
+                        TestCaseIndex.add_dir(_problem["test_case_id"])
+                        score = []
+                        for item in _problem["test_case_info"]["test_cases"].values():
+                            score.append({"score": 0, "input_name": item["input_name"],
+                                          "output_name": item.get("output_name")})
+                        problem_data = helper.save_image(_problem, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
+                        s = FPSProblemSerializer(data=problem_data)
+                        if not s.is_valid():
+                            raise ValueError(s.errors)
+                        problem_data = s.data
+                        problem_data["test_case_id"] = _problem["test_case_id"]
+                        problem_data["test_case_score"] = score
+                        self._create_problem(problem_data, request.user)
+                        count += 1
+            except Exception as e:
+                # 事务已经回滚, 已经写入的测试用例和图片也要删除
+                for test_case_id in parser.test_case_ids:
+                    TestCaseIndex.delete_dir(test_case_id)
+                delete_files(*helper.image_paths)
+                if isinstance(e, (ValueError, ParseError)):
+                    return self.error(f"Parse FPS file error: {e}")
+                raise
+        return self.success({"import_count": count})
@@ -1,29 +1,35 @@
-import random
-from django.db.models import Q, Count
 from utils.api import APIView
 from account.decorators import check_contest_permission
+from ..cache import ProblemDetailCache, ProblemListCache, ProblemPickCache, add_counters
 from ..models import ProblemTag, Problem, ProblemRuleType
-from ..serializers import ProblemSerializer, TagSerializer, ProblemSafeSerializer
+from ..search import ProblemSearch
+from ..serializers import ProblemSerializer, ProblemListSerializer, TagSerializer, ProblemSafeSerializer
 from contest.models import ContestRuleType
+from submission.models import JudgeStatus
 
 
 class ProblemTagAPI(APIView):
     def get(self, request):
-        qs = ProblemTag.objects
+        tags = ProblemTag.objects.filter(problem_count__gt=0)
         keyword = request.GET.get("keyword")
         if keyword:
-            qs = ProblemTag.objects.filter(name__icontains=keyword)
-        tags = qs.annotate(problem_count=Count("problem")).filter(problem_count__gt=0)
+            tags = tags.filter(name__istartswith=keyword)
         return self.success(TagSerializer(tags, many=True).data)
 
 
 class PickOneAPI(APIView):
     def get(self, request):
-        problems = Problem.objects.filter(contest_id__isnull=True, visible=True)
-        count = problems.count()
-        if count == 0:
+        exclude = set()
+        # unsolved=1 时不选择已经通过的题目
+        if request.GET.get("unsolved") and request.user.is_authenticated:
+            profile = request.user.userprofile
+            for status in (profile.acm_problems_status, profile.oi_problems_status):
+                exclude.update(int(pk) for pk, item in status.get("problems", {}).items()
+                               if item["status"] == JudgeStatus.ACCEPTED)
+        problem_id = ProblemPickCache.pick(difficulty=request.GET.get("difficulty"), exclude=exclude)
+        if problem_id is None:
             return self.error("No problem to pick")
-        return self.success(problems[random.randint(0, count - 1)]._id)
+        return self.success(problem_id)
 
 
 class ProblemAPI(APIView):
@@ -50,38 +56,44 @@ class ProblemAPI(APIView):
         problem_id = request.GET.get("problem_id")
         if problem_id:
             try:
-                problem = Problem.objects.select_related("created_by") \
-                    .get(_id=problem_id, contest_id__isnull=True, visible=True)
-                problem_data = ProblemSerializer(problem).data
-                self._add_problem_status(request, problem_data)
-                return self.success(problem_data)
+                problem_data = ProblemDetailCache.get(
+                    Problem.objects.select_related("created_by").filter(contest_id__isnull=True, visible=True),
+                    None, problem_id, ProblemSerializer)
             except Problem.DoesNotExist:
                 return self.error("Problem does not exist")
+            self._add_problem_status(request, problem_data)
+            return self.success(problem_data)
 
         limit = request.GET.get("limit")
         if not limit:
             return self.error("Limit is needed")
 
-        problems = Problem.objects.select_related("created_by").filter(contest_id__isnull=True, visible=True)
-        # 按照标签筛选
-        tag_text = request.GET.get("tag")
-        if tag_text:
-            problems = problems.filter(tags__name=tag_text)
-
-        # 搜索的情况
-        keyword = request.GET.get("keyword", "").strip()
-        if keyword:
-            problems = problems.filter(Q(title__icontains=keyword) | Q(_id__icontains=keyword))
-
-        # 难度筛选
-        difficulty = request.GET.get("difficulty")
-        if difficulty:
-            problems = problems.filter(difficulty=difficulty)
+        params = {key: request.GET.get(key, "").strip() for key in ("tag", "keyword", "difficulty", "offset", "limit", "cursor")}
+        data = ProblemListCache.get_page(params, lambda: self._get_problem_list(request, params))
+        add_counters(data["results"])
         # 根据profile 为做过的题目添加标记
-        data = self.paginate_data(request, problems, ProblemSerializer)
         self._add_problem_status(request, data)
         return self.success(data)
 
+    def _get_problem_list(self, request, params):
+        problems = Problem.objects.prefetch_related("tags").filter(contest_id__isnull=True, visible=True)
+        # 按照标签筛选
+        if params["tag"]:
+            problems = problems.filter(tags__name=params["tag"])
+
+        # 难度筛选
+        if params["difficulty"]:
+            problems = problems.filter(difficulty=params["difficulty"])
+
+        # 搜索的情况, 按照相关度排序, 支持游标分页
+        if params["keyword"]:
+            problems = ProblemSearch.search(problems, params["keyword"])
+            data = self.paginate_data(request, problems, ProblemListSerializer, cursor_ordering=ProblemSearch.ordering)
+        else:
+            data = self.paginate_data(request, problems, ProblemListSerializer)
+        data["results"] = [dict(item) for item in data["results"]]
+        return data
+
 
 class ContestProblemAPI(APIView):
     def _add_problem_status(self, request, queryset_values):
@@ -98,17 +110,15 @@ class ContestProblemAPI(APIView):
     def get(self, request):
         problem_id = request.GET.get("problem_id")
         if problem_id:
+            details_permission = self.contest.problem_details_permission(request.user)
             try:
-                problem = Problem.objects.select_related("created_by").get(_id=problem_id,
-                                                                           contest=self.contest,
-                                                                           visible=True)
+                problem_data = ProblemDetailCache.get(
+                    Problem.objects.select_related("created_by").filter(contest=self.contest, visible=True),
+                    self.contest.id, problem_id, ProblemSerializer if details_permission else ProblemSafeSerializer)
             except Problem.DoesNotExist:
                 return self.error("Problem does not exist.")
-            if self.contest.problem_details_permission(request.user):
-                problem_data = ProblemSerializer(problem).data
+            if details_permission:
                 self._add_problem_status(request, [problem_data, ])
-            else:
-                problem_data = ProblemSafeSerializer(problem).data
             return self.success(problem_data)
 
         contest_problems = Problem.objects.select_related("created_by").filter(contest=self.contest, visible=True)
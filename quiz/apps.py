@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class QuizConfig(AppConfig):
+    name = "quiz"
+
+    def ready(self):
+        from . import signals  # noqa
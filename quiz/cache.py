@@ -0,0 +1,12 @@
+from utils.cache import PickCache
+from utils.constants import CacheKey
+from .models import Quiz
+
+
+class QuizPickCache(PickCache):
+    """
+    公开 quiz 被修改或删除时由 quiz.signals 把版本号加一
+    """
+    model = Quiz
+    key = CacheKey.quiz_pick
+    version_key = CacheKey.quiz_pick_version
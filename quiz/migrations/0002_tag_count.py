@@ -0,0 +1,31 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:36
+
+from django.db import migrations, models
+
+# 已有标签的 quiz_count, 之后由 quiz.signals 维护
+COUNT_SQL = """
+UPDATE quiz_tag SET quiz_count = (
+    SELECT COUNT(*) FROM quiz_tags JOIN quiz ON quiz.id = quiz_tags.quiz_id
+    WHERE quiz_tags.quiztag_id = quiz_tag.id AND quiz.visible AND quiz.contest_id IS NULL
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiztag',
+            name='quiz_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(COUNT_SQL, migrations.RunSQL.noop),
+        # 标签搜索使用 istartswith, 生成的是 UPPER("name"::text) LIKE UPPER(...)
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS quiz_tag_name_prefix_idx ON "quiz_tag" (UPPER("name"::text) text_pattern_ops)',
+            "DROP INDEX IF EXISTS quiz_tag_name_prefix_idx"),
+    ]
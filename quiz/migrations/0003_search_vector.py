@@ -0,0 +1,48 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# 和 quiz.search.UPDATE_SQL 相同, 复制到迁移中, 之后修改 quiz.search 不会影响这个迁移
+UPDATE_SQL = """
+UPDATE quiz SET search_vector =
+    setweight(to_tsvector('simple', regexp_replace(quiz._id || ' ' || quiz.title, '[[:punct:]]+', ' ', 'g')), 'A') ||
+    setweight(to_tsvector('simple', regexp_replace(coalesce(tags.names, ''), '[[:punct:]]+', ' ', 'g')), 'B') ||
+    setweight(to_tsvector('simple', regexp_replace(regexp_replace(quiz.description, '<[^>]*>|&[a-z]+;', ' ', 'g'),
+                                                   '[[:punct:]]+', ' ', 'g')), 'C')
+FROM (
+    SELECT quiz.id, string_agg(quiz_tag.name, ' ') AS names FROM quiz
+    LEFT JOIN quiz_tags ON quiz_tags.quiz_id = quiz.id
+    LEFT JOIN quiz_tag ON quiz_tag.id = quiz_tags.quiztag_id
+    GROUP BY quiz.id
+) AS tags
+WHERE tags.id = quiz.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_tag_count'),
+        # pg_trgm
+        ('account', '0004_username_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(null=True),
+        ),
+        # 先生成 search_vector 再建索引
+        migrations.RunSQL(UPDATE_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='quiz_search_vector_idx'),
+        ),
+        # 关键词中有中文时使用 title__icontains
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS quiz_title_trgm_idx ON "quiz" USING gin (UPPER("title"::text) gin_trgm_ops)',
+            "DROP INDEX IF EXISTS quiz_title_trgm_idx"),
+    ]
@@ -0,0 +1,9 @@
+from utils.search import FullTextSearch
+from .models import Quiz
+
+
+class QuizSearch(FullTextSearch):
+    """
+    search_vector 由 quiz.signals 在 quiz 保存和标签修改之后更新
+    """
+    model = Quiz
@@ -114,7 +114,7 @@ class BaseQuizSerializer(serializers.ModelSerializer):
 class QuizAdminSerializer(BaseQuizSerializer):
     class Meta:
         model = Quiz
-        fields = "__all__"
+        exclude = ("search_vector",)
 
 
 class QuizSerializer(BaseQuizSerializer):
@@ -123,7 +123,7 @@ class QuizSerializer(BaseQuizSerializer):
     class Meta:
         model = Quiz
         exclude = ("test_case_score", "test_case_id", "visible", "is_public",
-                   "spj_code", "spj_version", "spj_compile_ok")
+                   "spj_code", "spj_version", "spj_compile_ok", "search_vector")
 
 
 class QuizSafeSerializer(BaseQuizSerializer):
@@ -133,7 +133,7 @@ class QuizSafeSerializer(BaseQuizSerializer):
         model = Quiz
         exclude = ("test_case_score", "test_case_id", "visible", "is_public",
                    "spj_code", "spj_version", "spj_compile_ok",
-                   "difficulty", "submission_number", "accepted_number", "statistic_info")
+                   "difficulty", "submission_number", "accepted_number", "statistic_info", "search_vector")
 
 
 class ContestQuizMakePublicSerializer(serializers.Serializer):
@@ -0,0 +1,14 @@
+from utils.signals import TaggedModelSignals
+from .cache import QuizPickCache
+from .models import Quiz, QuizTag
+from .search import QuizSearch
+
+
+class QuizSignals(TaggedModelSignals):
+    model = Quiz
+    search = QuizSearch
+    cache = QuizPickCache
+    refresh_tag_count = staticmethod(QuizTag.refresh_quiz_count)
+
+
+QuizSignals.connect()
@@ -5,15 +5,16 @@ import os
 import tempfile
 import zipfile
 from wsgiref.util import FileWrapper
+from xml.etree.ElementTree import ParseError
 
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
 from django.http import StreamingHttpResponse, FileResponse
 
 from account.decorators import quiz_permission_required, ensure_created_by
+from conf.test_case_index import TestCaseIndex
 from contest.models import Contest, ContestStatus
-from fps.parser import FPSHelper, FPSParser
+from fps.parser import FPSHelper, FPSStreamParser
 from judge.dispatcher import SPJCompiler
 from options.options import SysOptions
 from submission.models import Submission, JudgeStatus
@@ -22,6 +23,7 @@ from utils.constants import Difficulty
 from utils.shortcuts import rand_str, natural_sort_key
 from utils.tasks import delete_files
 from ..models import Quiz, QuizRuleType, QuizTag
+from ..search import QuizSearch
 from ..serializers import (CreateContestQuizSerializer, CompileSPJSerializer,
                            CreateQuizSerializer, EditQuizSerializer, EditContestQuizSerializer,
                            QuizAdminSerializer, TestCaseUploadForm, ContestQuizMakePublicSerializer,
@@ -101,11 +103,12 @@ class QuizAPI(QuizBase):
             else:
                 quizs = quizs.filter(rule_type=rule_type)
 
-        keyword = request.GET.get("keyword", "").strip()
-        if keyword:
-            quizs = quizs.filter(Q(title__icontains=keyword) | Q(_id__icontains=keyword))
         if not user.can_mgmt_all_quiz():
             quizs = quizs.filter(created_by=user)
+        keyword = request.GET.get("keyword", "").strip()
+        if keyword:
+            quizs = QuizSearch.search(quizs, keyword)
+            return self.success(self.paginate_data(request, quizs, QuizAdminSerializer, cursor_ordering=QuizSearch.ordering))
         return self.success(self.paginate_data(request, quizs, QuizAdminSerializer))
 
     @quiz_permission_required
@@ -401,35 +404,44 @@ class FPSQuizImport(CSRFExemptAPIView):
 
     def post(self, request):
         form = UploadQuizForm(request.POST, request.FILES)
-        if form.is_valid():
-            file = form.cleaned_data["file"]
-            with tempfile.NamedTemporaryFile("wb") as tf:
-                for chunk in file.chunks(4096):
-                    tf.file.write(chunk)
-
-                tf.file.flush()
-                os.fsync(tf.file)
-
-                quizs = FPSParser(tf.name).parse()
-        else:
+        if not form.is_valid():
             return self.error("Parse upload file error")
+        file = form.cleaned_data["file"]
 
         helper = FPSHelper()
-        with transaction.atomic():
-            for _quiz in quizs:
-                test_case_id = rand_str()
-                test_case_dir = os.path.join(settings.TEST_CASE_DIR, test_case_id)
-                os.mkdir(test_case_dir)
-                score = []
-                for item in helper.save_test_case(_quiz, test_case_dir)["test_cases"].values():
-                    score.append({"score": 0, "input_name": item["input_name"],
-                                  "output_name": item.get("output_name")})
-                quiz_data = helper.save_image(_quiz, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
-                s = FPSQuizSerializer(data=quiz_data)
-                if not s.is_valid():
-                    return self.error(f"Parse FPS file error: {s.errors}")
-                quiz_data = s.data
-                quiz_data["test_case_id"] = test_case_id
-                quiz_data["test_case_score"] = score
-                self._create_quiz(quiz_data, request.user)
-        return self.success({"import_count": len(quizs)})
+        count = 0
+        with tempfile.NamedTemporaryFile("wb") as tf:
+            for chunk in file.chunks(4096):
+                tf.file.write(chunk)
+
+            tf.file.flush()
+            os.fsync(tf.file)
+
+            # 流式解析, 每次只处理一道题, 测试用例在解析时直接写入 TEST_CASE_DIR
+            parser = FPSStreamParser(tf.name, settings.TEST_CASE_DIR)
+            try:
+                with transaction.atomic():
+                    for _quiz in parser.parse():
+                        TestCaseIndex.add_dir(_quiz["test_case_id"])
+                        score = []
+                        for item in _quiz["test_case_info"]["test_cases"].values():
+                            score.append({"score": 0, "input_name": item["input_name"],
+                                          "output_name": item.get("output_name")})
+                        quiz_data = helper.save_image(_quiz, settings.UPLOAD_DIR, settings.UPLOAD_PREFIX)
+                        s = FPSQuizSerializer(data=quiz_data)
+                        if not s.is_valid():
+                            raise ValueError(s.errors)
+                        quiz_data = s.data
+                        quiz_data["test_case_id"] = _quiz["test_case_id"]
+                        quiz_data["test_case_score"] = score
+                        self._create_quiz(quiz_data, request.user)
+                        count += 1
+            except Exception as e:
+                # 事务已经回滚, 已经写入的测试用例和图片也要删除
+                for test_case_id in parser.test_case_ids:
+                    TestCaseIndex.delete_dir(test_case_id)
+                delete_files(*helper.image_paths)
+                if isinstance(e, (ValueError, ParseError)):
+                    return self.error(f"Parse FPS file error: {e}")
+                raise
+        return self.success({"import_count": count})
@@ -1,29 +1,28 @@
-import random
-from django.db.models import Q, Count
 from utils.api import APIView
 from account.decorators import check_contest_permission
+from ..cache import QuizPickCache
 from ..models import QuizTag, Quiz, QuizRuleType
+from ..search import QuizSearch
 from ..serializers import QuizSerializer, TagSerializer, QuizSafeSerializer
 from contest.models import ContestRuleType
 
 
 class QuizTagAPI(APIView):
     def get(self, request):
-        qs = QuizTag.objects
+        tags = QuizTag.objects.filter(quiz_count__gt=0)
         keyword = request.GET.get("keyword")
         if keyword:
-            qs = QuizTag.objects.filter(name__icontains=keyword)
-        tags = qs.annotate(quiz_count=Count("quiz")).filter(quiz_count__gt=0)
+            tags = tags.filter(name__istartswith=keyword)
         return self.success(TagSerializer(tags, many=True).data)
 
 
 class PickOneAPI(APIView):
     def get(self, request):
-        quizs = Quiz.objects.filter(contest_id__isnull=True, visible=True)
-        count = quizs.count()
-        if count == 0:
+        # 判题时不记录 quiz 的通过状态, 所以不支持 unsolved
+        quiz_id = QuizPickCache.pick(difficulty=request.GET.get("difficulty"))
+        if quiz_id is None:
             return self.error("No quiz to pick")
-        return self.success(quizs[random.randint(0, count - 1)]._id)
+        return self.success(quiz_id)
 
 
 class QuizAPI(APIView):
@@ -68,17 +67,19 @@ class QuizAPI(APIView):
         if tag_text:
             quizs = quizs.filter(tags__name=tag_text)
 
-        # 搜索的情况
-        keyword = request.GET.get("keyword", "").strip()
-        if keyword:
-            quizs = quizs.filter(Q(title__icontains=keyword) | Q(_id__icontains=keyword))
-
         # 难度筛选
         difficulty = request.GET.get("difficulty")
         if difficulty:
             quizs = quizs.filter(difficulty=difficulty)
+
+        # 搜索的情况, 按照相关度排序
+        cursor_ordering = None
+        keyword = request.GET.get("keyword", "").strip()
+        if keyword:
+            quizs = QuizSearch.search(quizs, keyword)
+            cursor_ordering = QuizSearch.ordering
         # 根据profile 为做过的题目添加标记
-        data = self.paginate_data(request, quizs, QuizSerializer)
+        data = self.paginate_data(request, quizs, QuizSerializer, cursor_ordering=cursor_ordering)
         self._add_quiz_status(request, data)
         return self.success(data)
 
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from submission.models import Submission
+from utils.compression import Dictionaries
+
+# 压缩列还没有回填的数据, 读取时 code 和 info 从原来的列读出
+UNCOMPRESSED_SQL = "code_compressed IS NULL OR info_compressed IS NULL"
+# 回填之后清空原来的列, 释放空间
+CLEAR_LEGACY_SQL = "UPDATE submission SET code = NULL, info = NULL WHERE id = ANY(%s)"
+
+
+class Command(BaseCommand):
+    help = "Backfill the compressed code and info columns of submissions stored before them, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--train", type=int, default=0,
+                            help="train new zstd dictionaries from this many recent submissions first")
+        parser.add_argument("--batch", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.1, help="seconds to sleep between batches")
+
+    def train(self, samples):
+        submissions = Submission.objects.only("code", "info").order_by("-create_time")[:samples]
+        info_field = Submission._meta.get_field("info")
+        code_samples, info_samples = [], []
+        for submission in submissions.iterator():
+            code_samples.append(submission.code.encode("utf-8"))
+            info_samples.append(info_field.get_prep_value(submission.info).encode("utf-8"))
+        for field, field_samples in [(Submission._meta.get_field("code"), code_samples), (info_field, info_samples)]:
+            dict_id = Dictionaries.train(field.dictionary, field_samples)
+            self.stdout.write(f"Trained dictionary {field.dictionary}.{dict_id} from {len(field_samples)} samples")
+
+    def handle(self, *args, **options):
+        if options["train"]:
+            self.train(options["train"])
+
+        uncompressed = Submission.objects.annotate(
+            uncompressed=RawSQL(UNCOMPRESSED_SQL, [], output_field=BooleanField())
+        ).filter(uncompressed=True).only("id", "code", "info").order_by("id")
+        last_id, total = "", 0
+        while True:
+            # 正在判题的提交会被跳过, 下次运行时再处理
+            with transaction.atomic():
+                submissions = list(uncompressed.select_for_update(skip_locked=True).filter(id__gt=last_id)[:options["batch"]])
+                if not submissions:
+                    break
+                Submission.objects.bulk_update(submissions, ["code", "info"])
+                with connection.cursor() as cursor:
+                    cursor.execute(CLEAR_LEGACY_SQL, [[submission.id for submission in submissions]])
+            last_id = submissions[-1].id
+            total += len(submissions)
+            self.stdout.write(f"Compressed {total} submissions, last id {last_id}")
+            time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} submissions compressed"))
@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from submission.partitions import archive_partitions, create_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = "Create monthly submission partitions ahead of time and archive old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=12, help="create partitions for this many months ahead")
+        parser.add_argument("--archive-before", type=str,
+                            help="move partitions that end before this month (YYYY-MM) to submission_archive")
+
+    def handle(self, *args, **options):
+        for name in create_partitions(options["months"]):
+            self.stdout.write(f"Created partition {name}")
+
+        if options["archive_before"]:
+            try:
+                before = month_start(timezone.make_aware(datetime.datetime.strptime(options["archive_before"], "%Y-%m")))
+            except ValueError:
+                raise CommandError("--archive-before must be YYYY-MM")
+            # 当前月份的分区还在写入, 不能归档
+            current_month = month_start(timezone.now())
+            if before > current_month:
+                raise CommandError(f"Can not archive partitions after {current_month:%Y-%m}")
+            for name in archive_partitions(before):
+                self.stdout.write(f"Archived partition {name}")
+        self.stdout.write(self.style.SUCCESS("Done"))
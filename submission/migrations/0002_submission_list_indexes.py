@@ -0,0 +1,44 @@
+# Generated by Django 3.2.9 on 2026-10-19 06:42
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY 不能在事务中执行, 建索引时不会锁住 submission 表的写入
+    atomic = False
+
+    dependencies = [
+        ('submission', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('contest__isnull', True)), fields=['-create_time', '-id'], name='submission_public_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('contest__isnull', True)), fields=['problem', '-create_time', '-id'], name='submission_public_problem_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('contest__isnull', True)), fields=['user_id', '-create_time', '-id'], name='submission_public_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('contest__isnull', True)), fields=['result', '-create_time', '-id'], name='submission_public_result_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['contest', '-create_time', '-id'], name='submission_contest_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['contest', 'user_id', '-create_time', '-id'], name='submission_contest_user_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='submission',
+            index=models.Index(fields=['contest', 'problem', '-create_time', '-id'], name='submission_contest_problem_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY 不能在事务中执行
+    atomic = False
+
+    dependencies = [
+        ('submission', '0002_submission_list_indexes'),
+    ]
+
+    # 和 icontains/istartswith 生成的 UPPER("username"::text) LIKE UPPER(...) 一致, 否则不会使用索引
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS submission_username_trgm_idx '
+            'ON "submission" USING gin (UPPER("username"::text) gin_trgm_ops)',
+            "DROP INDEX CONCURRENTLY IF EXISTS submission_username_trgm_idx"),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS submission_username_prefix_idx '
+            'ON "submission" (UPPER("username"::text) text_pattern_ops)',
+            "DROP INDEX CONCURRENTLY IF EXISTS submission_username_prefix_idx"),
+    ]
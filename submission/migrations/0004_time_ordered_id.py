@@ -0,0 +1,19 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:08
+
+from django.db import migrations, models
+import utils.shortcuts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0003_username_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='id',
+            field=models.TextField(db_index=True, default=utils.shortcuts.time_ordered_id, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:20
+
+from django.db import migrations
+import utils.models
+
+# 不在原来的列上 ALTER TYPE, 那样会在 ACCESS EXCLUSIVE 锁下重写整个表
+# 新数据写到新加的压缩列, 原来的列改为可以为 NULL, 已有的数据读取时从原来的列读, 之后使用 compress_submissions 命令分批回填
+# 全部回填之后再删除原来的列, 去掉字段的 legacy_column
+# 数据已经压缩过, 不再使用 TOAST 压缩
+ADD_COLUMNS_SQL = [
+    "ALTER TABLE submission ADD COLUMN code_compressed bytea, ADD COLUMN info_compressed bytea, "
+    "ALTER COLUMN code DROP NOT NULL, ALTER COLUMN info DROP NOT NULL",
+    "ALTER TABLE submission ALTER COLUMN code_compressed SET STORAGE EXTERNAL, "
+    "ALTER COLUMN info_compressed SET STORAGE EXTERNAL",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submission', '0004_time_ordered_id'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(ADD_COLUMNS_SQL)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='submission',
+                    name='code',
+                    field=utils.models.CompressedTextField(db_column='code_compressed', dictionary='submission_code', legacy_column='code'),
+                ),
+                migrations.AlterField(
+                    model_name='submission',
+                    name='info',
+                    field=utils.models.CompressedJSONField(db_column='info_compressed', default=dict, dictionary='submission_info', legacy_column='info'),
+                ),
+            ],
+        ),
+    ]
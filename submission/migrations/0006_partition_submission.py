@@ -0,0 +1,94 @@
+# Generated by Django 3.2.9 on 2026-10-19 07:25
+
+from django.db import migrations, models
+import utils.models
+import utils.shortcuts
+
+# 分区表的主键必须包含分区键, 所以主键改为 (id, create_time)
+# 新主键的唯一索引先在原表上 CONCURRENTLY 创建, 不锁表, 之后用 USING INDEX 直接变为主键, 不再重建索引
+PK_INDEX_SQL = "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS submission_id_create_time_uniq ON submission (id, create_time)"
+
+# 原来的 submission 表改名为 submission_history, 作为新的分区表 submission 的第一个分区, 不需要复制数据
+# 索引和外键按照原来的定义在分区表上重新创建, 挂载分区时会复用 submission_history 上相同的索引
+# 挂载之前先加上和分区范围相同的 CHECK 约束, ATTACH 时不再扫描一次 submission_history
+# 没有对应分区的数据写到 submission_default, 避免分区没有提前创建时插入失败
+# submission_archive 是冷数据, 不建外键, 归档时也会删除分区上的外键, 见 submission.partitions.archive_partitions
+# 迁移不在事务中运行, 多条语句作为一次查询执行, postgres 会把它们放在同一个事务中
+PARTITION_SQL = """
+ALTER TABLE submission RENAME TO submission_history;
+ALTER TABLE submission_history DROP CONSTRAINT submission_pkey;
+ALTER TABLE submission_history ADD CONSTRAINT submission_history_pkey PRIMARY KEY USING INDEX submission_id_create_time_uniq;
+CREATE TABLE submission (LIKE submission_history INCLUDING DEFAULTS INCLUDING STORAGE) PARTITION BY RANGE (create_time);
+ALTER TABLE submission ADD CONSTRAINT submission_pkey PRIMARY KEY (id, create_time);
+DO $$
+DECLARE
+    item record;
+BEGIN
+    FOR item IN SELECT indexrelid::regclass::text AS name, pg_get_indexdef(indexrelid) AS definition
+                FROM pg_index WHERE indrelid = 'submission_history'::regclass AND NOT indisprimary LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', item.name, left(item.name, 55) || '_history');
+        EXECUTE regexp_replace(item.definition, ' ON \\S+ USING ', ' ON submission USING ');
+    END LOOP;
+    FOR item IN SELECT conname AS name, pg_get_constraintdef(oid) AS definition
+                FROM pg_constraint WHERE conrelid = 'submission_history'::regclass AND contype = 'f' LOOP
+        EXECUTE format('ALTER TABLE submission ADD CONSTRAINT %I %s', item.name, item.definition);
+    END LOOP;
+    EXECUTE format('ALTER TABLE submission_history ADD CONSTRAINT submission_history_range_check CHECK (create_time < %L)',
+                   date_trunc('month', now()) + interval '1 month');
+    EXECUTE format('ALTER TABLE submission ATTACH PARTITION submission_history FOR VALUES FROM (MINVALUE) TO (%L)',
+                   date_trunc('month', now()) + interval '1 month');
+END $$;
+ALTER TABLE submission_history DROP CONSTRAINT submission_history_range_check;
+CREATE TABLE submission_default PARTITION OF submission DEFAULT;
+CREATE TABLE submission_archive (LIKE submission INCLUDING DEFAULTS INCLUDING STORAGE) PARTITION BY RANGE (create_time);
+ALTER TABLE submission_archive ADD CONSTRAINT submission_archive_pkey PRIMARY KEY (id, create_time);
+"""
+
+# 之后 12 个月的分区, 和 submission.partitions.create_partitions 的结果相同, 之后由 submission_partitions 命令继续创建
+CREATE_PARTITIONS_SQL = """
+DO $$
+DECLARE
+    start timestamptz;
+BEGIN
+    FOR start IN SELECT generate_series(date_trunc('month', now()) + interval '1 month',
+                                        date_trunc('month', now()) + interval '12 month', interval '1 month') LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF submission FOR VALUES FROM (%L) TO (%L)',
+                       'submission_' || to_char(start, 'YYYYMM'), start, start + interval '1 month');
+    END LOOP;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY 不能在事务中运行
+    atomic = False
+
+    dependencies = [
+        ('submission', '0005_compressed_code_info'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PK_INDEX_SQL),
+        migrations.RunSQL(PARTITION_SQL),
+        migrations.RunSQL(CREATE_PARTITIONS_SQL),
+        migrations.CreateModel(
+            name='ArchivedSubmission',
+            fields=[
+                ('id', models.TextField(db_index=True, default=utils.shortcuts.time_ordered_id, primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('user_id', models.IntegerField(db_index=True)),
+                ('username', models.TextField()),
+                ('code', utils.models.CompressedTextField(db_column='code_compressed', dictionary='submission_code', legacy_column='code')),
+                ('result', models.IntegerField(db_index=True, default=6)),
+                ('info', utils.models.CompressedJSONField(db_column='info_compressed', default=dict, dictionary='submission_info', legacy_column='info')),
+                ('language', models.TextField()),
+                ('shared', models.BooleanField(default=False)),
+                ('statistic_info', models.JSONField(default=dict)),
+                ('ip', models.TextField(null=True)),
+            ],
+            options={
+                'db_table': 'submission_archive',
+                'managed': False,
+            },
+        ),
+    ]
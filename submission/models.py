@@ -1,12 +1,13 @@
 from django.db import models
+from django.db.models import Q
 
 from utils.constants import ContestStatus
-from utils.models import JSONField
+from utils.models import CompressedJSONField, CompressedTextField, JSONField
 from problem.models import Problem
 from quiz.models import Quiz
 from contest.models import Contest
 
-from utils.shortcuts import rand_str
+from utils.shortcuts import time_ordered_id
 
 
 class JudgeStatus:
@@ -23,18 +24,19 @@ class JudgeStatus:
     PARTIALLY_ACCEPTED = 8
 
 
-class Submission(models.Model):
-    id = models.TextField(default=rand_str, primary_key=True, db_index=True)
+class AbstractSubmission(models.Model):
+    id = models.TextField(default=time_ordered_id, primary_key=True, db_index=True)
     contest = models.ForeignKey(Contest, null=True, on_delete=models.CASCADE)
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     create_time = models.DateTimeField(auto_now_add=True)
     user_id = models.IntegerField(db_index=True)
     username = models.TextField()
-    code = models.TextField()
+    code = CompressedTextField(dictionary="submission_code", db_column="code_compressed", legacy_column="code")
     result = models.IntegerField(db_index=True, default=JudgeStatus.PENDING)
     # 从JudgeServer返回的判题详情
-    info = JSONField(default=dict)
+    info = CompressedJSONField(default=dict, dictionary="submission_info", db_column="info_compressed",
+                               legacy_column="info")
     language = models.TextField()
     shared = models.BooleanField(default=False)
     # 存储该提交所用时间和内存值，方便提交列表显示
@@ -55,9 +57,43 @@ class Submission(models.Model):
                 return True
         return False
 
+    def __str__(self):
+        return self.id
+
+    class Meta:
+        abstract = True
+
+
+class Submission(AbstractSubmission):
+    """
+    submission 表按照 create_time 每月分区, 分区由 submission.partitions 维护
+    删除题目或者比赛时和之前一样由 django 级联删除所有分区中的提交
+    """
     class Meta:
         db_table = "submission"
         ordering = ("-create_time",)
+        # 提交列表的常用过滤条件, 都按照 (-create_time, -id) 排序, 和游标分页的顺序一致
+        indexes = [
+            models.Index(fields=["-create_time", "-id"], name="submission_public_time_idx", condition=Q(contest__isnull=True)),
+            models.Index(fields=["problem", "-create_time", "-id"], name="submission_public_problem_idx",
+                         condition=Q(contest__isnull=True)),
+            models.Index(fields=["user_id", "-create_time", "-id"], name="submission_public_user_idx", condition=Q(contest__isnull=True)),
+            models.Index(fields=["result", "-create_time", "-id"], name="submission_public_result_idx", condition=Q(contest__isnull=True)),
+            models.Index(fields=["contest", "-create_time", "-id"], name="submission_contest_time_idx"),
+            models.Index(fields=["contest", "user_id", "-create_time", "-id"], name="submission_contest_user_idx"),
+            models.Index(fields=["contest", "problem", "-create_time", "-id"], name="submission_contest_problem_idx"),
+        ]
 
-    def __str__(self):
-        return self.id
+
+class ArchivedSubmission(AbstractSubmission):
+    """
+    从 submission 中分离出来的旧分区, 只能按照 id 查询
+    没有外键约束, 删除题目或者比赛时保留归档的提交, 不会级联删除
+    """
+    contest = models.ForeignKey(Contest, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    problem = models.ForeignKey(Problem, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    quiz = models.ForeignKey(Quiz, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+
+    class Meta:
+        db_table = "submission_archive"
+        managed = False
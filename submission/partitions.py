@@ -0,0 +1,113 @@
+"""
+submission 表按照 create_time 每月一个分区, 分区名为 submission_YYYYMM
+迁移之前的数据在 submission_history 分区中, 范围是 MINVALUE 到迁移时的下个月
+没有对应月份分区的数据会写到 submission_default 分区, 创建分区时再移到新分区中
+旧分区可以从 submission 分离并挂到 submission_archive 上, 只保留主键索引, 用于按 id 查询
+submission_archive 是冷数据, 没有外键, 删除题目或者比赛时不会删除其中的提交
+"""
+import re
+
+from dateutil import parser
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARENT = "submission"
+DEFAULT = "submission_default"
+ARCHIVE = "submission_archive"
+BOUND_RE = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def month_start(dt):
+    return timezone.localtime(dt).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(dt, months):
+    year, month = divmod(dt.month - 1 + months, 12)
+    return dt.replace(year=dt.year + year, month=month + 1)
+
+
+def _parse_bound(value):
+    if value == "MINVALUE":
+        return None
+    return parser.parse(value.strip("'"))
+
+
+def list_partitions(parent=PARENT):
+    """
+    返回 [(name, lower, upper)], 按照 lower 排序, lower 为 None 表示 MINVALUE
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+                       "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass", [parent])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            continue
+        lower, upper = BOUND_RE.search(bound).groups()
+        partitions.append((name, _parse_bound(lower), _parse_bound(upper)))
+    return sorted(partitions, key=lambda item: (item[1] is not None, item[1]))
+
+
+def _add_range_check(cursor, name, lower, upper):
+    """
+    加上和分区范围相同的 CHECK 约束, ATTACH 时就不需要在 ACCESS EXCLUSIVE 锁下扫描整个分区
+    先 NOT VALID 再 VALIDATE, 校验期间不阻塞读写
+    """
+    condition, params = ("create_time < %s", [upper]) if lower is None else \
+        ("create_time >= %s AND create_time < %s", [lower, upper])
+    cursor.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_range_check CHECK ({condition}) NOT VALID", params)
+    cursor.execute(f"ALTER TABLE {name} VALIDATE CONSTRAINT {name}_range_check")
+
+
+def create_partitions(months=12):
+    """
+    创建从最后一个分区到 months 个月之后的分区, 返回新建的分区名
+    """
+    partitions = list_partitions()
+    start = max(upper for _, _, upper in partitions) if partitions else month_start(timezone.now())
+    start = month_start(start)
+    end = add_months(month_start(timezone.now()), months + 1)
+    created = []
+    while start < end:
+        name = f"{PARENT}_{start.year}{start.month:02d}"
+        upper = add_months(start, 1)
+        # 新分区范围内的数据可能已经写到了 submission_default, 要先移过去才能 ATTACH
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING STORAGE)")
+            cursor.execute(f"WITH moved AS (DELETE FROM {DEFAULT} WHERE create_time >= %s AND create_time < %s "
+                           f"RETURNING *) INSERT INTO {name} SELECT * FROM moved", [start, upper])
+            _add_range_check(cursor, name, start, upper)
+            cursor.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [start, upper])
+            cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range_check")
+        created.append(name)
+        start = upper
+    return created
+
+
+def archive_partitions(before):
+    """
+    把范围完全在 before 之前的分区移到 submission_archive, 返回移动的分区名
+    分离之后除主键之外的索引都会删除, 分离之前先校验好 CHECK 约束, 挂到 submission_archive 时不再扫描分区
+    """
+    archived = []
+    for name, lower, upper in list_partitions():
+        if upper > before:
+            break
+        with connection.cursor() as cursor:
+            _add_range_check(cursor, name, lower, upper)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+            cursor.execute("SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass AND NOT indisprimary",
+                           [name])
+            for index_name, in cursor.fetchall():
+                cursor.execute(f"DROP INDEX {index_name}")
+            # 分离之后分区上仍然保留着外键, 归档的数据不再和题目, 比赛关联
+            cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name])
+            for constraint_name, in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {constraint_name}")
+            cursor.execute(f"ALTER TABLE {ARCHIVE} ATTACH PARTITION {name} FOR VALUES FROM "
+                           f"({'MINVALUE' if lower is None else '%s'}) TO (%s)", [upper] if lower is None else [lower, upper])
+            cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_range_check")
+        archived.append(name)
+    return archived
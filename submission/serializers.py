@@ -1,3 +1,8 @@
+from django.db.models import Prefetch, prefetch_related_objects
+
+from contest.models import Contest
+from problem.models import Problem
+from quiz.models import Quiz
 from .models import Submission
 from utils.api import serializers
 from utils.serializers import LanguageNameChoiceField
@@ -32,6 +37,19 @@ class SubmissionSafeModelSerializer(serializers.ModelSerializer):
         exclude = ("info", "contest", "ip")
 
 
+class SubmissionListListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        data = list(data)
+        user = self.child.user
+        if user is not None and user.is_authenticated and not self.child.manage_all:
+            # check_user_permission 用到的 problem, quiz 和 contest 一次性读取, 已经 select_related 的不会重复查询
+            prefetch_related_objects(data,
+                                     Prefetch("problem", queryset=Problem.objects.only("_id", "created_by", "share_submission")),
+                                     Prefetch("quiz", queryset=Quiz.objects.only("created_by", "share_submission")),
+                                     Prefetch("contest", queryset=Contest.objects.only("start_time", "end_time")))
+        return super().to_representation(data)
+
+
 class SubmissionListSerializer(serializers.ModelSerializer):
     problem = serializers.SlugRelatedField(read_only=True, slug_field="_id")
     show_link = serializers.SerializerMethodField()
@@ -39,13 +57,17 @@ class SubmissionListSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
+        # 用户级别的权限只检查一次
+        self.manage_all = self.user is not None and self.user.is_authenticated and \
+            (self.user.is_super_admin() or self.user.can_mgmt_all_problem() or self.user.can_mgmt_all_quiz())
 
     class Meta:
         model = Submission
         exclude = ("info", "contest", "code", "ip")
+        list_serializer_class = SubmissionListListSerializer
 
     def get_show_link(self, obj):
         # 没传user或为匿名user
         if self.user is None or not self.user.is_authenticated:
             return False
-        return obj.check_user_permission(self.user)
+        return self.manage_all or obj.check_user_permission(self.user)
@@ -1,9 +1,28 @@
+import datetime
+import io
+import json
+import zlib
 from copy import deepcopy
 from unittest import mock
 
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from contest.models import Contest
+from options.models import CompressionDictionary
 from problem.models import Problem, ProblemTag
+from quiz.models import Quiz
 from utils.api.tests import APITestCase
-from .models import Submission
+from utils.cache import cache
+from utils.compression import RAW, ZLIB, ZSTD, Dictionaries, compress, decompress
+from utils.shortcuts import rand_str, time_ordered_id, time_ordered_id_bound
+from utils.throttling import TokenBucket, SlidingWindow
+from .models import ArchivedSubmission, Submission
+from .serializers import SubmissionListSerializer
+from .partitions import add_months, archive_partitions, create_partitions, list_partitions, month_start
+from .views.oj import submission_list_queryset
 
 DEFAULT_PROBLEM_DATA = {"_id": "A-110", "title": "test", "description": "<p>test</p>", "input_description": "test",
                         "output_description": "test", "time_limit": 1000, "memory_limit": 256, "difficulty": "Low",
@@ -57,6 +76,15 @@ class SubmissionListTest(SubmissionPrepare):
         self.assertSuccess(resp)
 
 
+class SubmissionListQuerySetTest(SimpleTestCase):
+    def test_heavy_columns_deferred(self):
+        sql = str(submission_list_queryset(contest_id__isnull=True).query)
+        for column in ['"submission"."statistic_info"', '"problem"."_id"', '"quiz"."share_submission"']:
+            self.assertIn(column, sql)
+        for column in ['"submission"."code"', '"submission"."info"', '"problem"."description"', '"quiz"."template"']:
+            self.assertNotIn(column, sql)
+
+
 @mock.patch("submission.views.oj.judge_task.send")
 class SubmissionAPITest(SubmissionPrepare):
     def setUp(self):
@@ -76,3 +104,209 @@ class SubmissionAPITest(SubmissionPrepare):
         self.assertDictEqual(resp.data, {"error": "error",
                                          "data": "Python3 is now allowed in the problem"})
         judge_task.assert_not_called()
+
+
+class ThrottlingTest(SimpleTestCase):
+    user_key = "throttling:test:user"
+    ip_key = "throttling:test:ip"
+
+    def tearDown(self):
+        cache.delete_many([self.user_key, self.ip_key])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(key=self.user_key, capacity=2, fill_rate=0.01, default_capacity=2, redis_conn=cache)
+        self.assertEqual(bucket.consume(), (True, 0))
+        self.assertEqual(bucket.consume(), (True, 0))
+        can_consume, wait = bucket.consume()
+        self.assertFalse(can_consume)
+        self.assertGreater(wait, 0)
+        self.assertGreater(cache.ttl(self.user_key), 0)
+
+    def test_invalid_fill_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(key=self.user_key, capacity=2, fill_rate=0, default_capacity=2, redis_conn=cache)
+
+    def test_script_registered_once(self):
+        bucket = TokenBucket(key=self.user_key, capacity=5, fill_rate=0.01, default_capacity=5, redis_conn=cache)
+        bucket.consume()
+        with mock.patch.object(cache, "register_script") as register_script:
+            self.assertEqual(bucket.consume(), (True, 0))
+            register_script.assert_not_called()
+        # redis 重启之后脚本会重新加载
+        cache.script_flush()
+        self.assertEqual(bucket.consume(), (True, 0))
+
+    def test_consume_all_is_all_or_nothing(self):
+        user_bucket = TokenBucket(key=self.user_key, capacity=5, fill_rate=0.01, default_capacity=5, redis_conn=cache)
+        ip_bucket = TokenBucket(key=self.ip_key, capacity=1, fill_rate=0.01, default_capacity=1, redis_conn=cache)
+        self.assertEqual(TokenBucket.consume_all([user_bucket, ip_bucket]), (None, 0))
+        bucket, _ = TokenBucket.consume_all([user_bucket, ip_bucket])
+        self.assertIs(bucket, ip_bucket)
+        # ip bucket 不足时 user bucket 也不会扣除
+        self.assertAlmostEqual(float(cache.hget(self.user_key, "last_capacity")), 4, places=1)
+
+    def test_sliding_window(self):
+        window = SlidingWindow(key=self.user_key, limit=2, window=60, redis_conn=cache)
+        self.assertTrue(window.consume()[0])
+        self.assertTrue(window.consume()[0])
+        can_consume, wait = window.consume()
+        self.assertFalse(can_consume)
+        self.assertTrue(0 < wait <= 60)
+
+
+class TimeOrderedIDTest(SimpleTestCase):
+    def test_format(self):
+        submission_id = time_ordered_id()
+        self.assertEqual(len(submission_id), len(rand_str()))
+        self.assertRegex(submission_id, r"^[0-9a-f]{32}$")
+
+    def test_monotonic(self):
+        ids = [time_ordered_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_bound(self):
+        start_time = datetime.datetime.now(datetime.timezone.utc)
+        submission_id = time_ordered_id()
+        self.assertLessEqual(time_ordered_id_bound(start_time), submission_id)
+        self.assertLess(submission_id, time_ordered_id_bound(start_time + datetime.timedelta(seconds=60)))
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        Dictionaries._by_id, Dictionaries._latest, Dictionaries._loaded_at = {}, {}, 0
+
+    def tearDown(self):
+        Dictionaries._by_id, Dictionaries._latest, Dictionaries._loaded_at = {}, {}, 0
+
+    def test_compress(self):
+        self.assertEqual(compress(b"short"), RAW + b"short")
+        data = b"int main() { return 0; }\n" * 100
+        compressed = compress(data)
+        self.assertTrue(compressed.startswith(ZSTD))
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(decompress(compressed), data)
+        self.assertEqual(decompress(ZLIB + zlib.compress(data)), data)
+
+    def test_dictionary(self):
+        samples = [f"#include <stdio.h>\nint main() {{ int a = {i}, b = {i * 7}; printf(\"%d\", a + b); }}\n".encode("utf-8")
+                   for i in range(2000)]
+        data = samples[0]
+        self.assertTrue(compress(data, "test").startswith(ZSTD))
+        dict_id = Dictionaries.train("test", samples, size=4096)
+        compressed = compress(data, "test")
+        self.assertLess(len(compressed), len(compress(data)))
+        self.assertTrue(CompressionDictionary.objects.filter(id=dict_id, name="test").exists())
+        # 其他进程中没有加载过这个字典
+        Dictionaries._by_id = {}
+        self.assertEqual(decompress(compressed), data)
+        self.assertIn(dict_id, Dictionaries._by_id)
+
+
+class QuizSubmissionPrepare(APITestCase):
+    def setUp(self):
+        self.user = user = self.create_admin("test", "test123")
+        problem_data = deepcopy(DEFAULT_PROBLEM_DATA)
+        problem_data.pop("tags")
+        problem = Problem.objects.create(created_by=user, **problem_data)
+        quiz = Quiz.objects.create(_id="Q-1", title="test", description="test", samples=[], test_case_id="test",
+                                   test_case_score=[], languages=["C"], template={}, created_by=user, time_limit=1000,
+                                   rule_type="ACM", difficulty="Low")
+        self.code = "int main() { return 0; }\n" * 20
+        self.info = {"err": None, "data": [{"result": 0, "test_case": str(i)} for i in range(10)]}
+        self.submission = Submission.objects.create(problem=problem, quiz=quiz, user_id=user.id, username=user.username,
+                                                    code=self.code, info=self.info, language="C")
+
+
+class CompressSubmissionsCommandTest(QuizSubmissionPrepare):
+    def codecs(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT get_byte(code_compressed, 0), get_byte(info_compressed, 0), code, info "
+                           "FROM submission WHERE id = %s", [self.submission.id])
+            return cursor.fetchone()
+
+    def test_compress_legacy_rows(self):
+        self.assertEqual(self.codecs(), (ZSTD[0], ZSTD[0], None, None))
+        # 迁移之前保存的数据
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE submission SET code_compressed = NULL, info_compressed = NULL, code = %s, info = %s "
+                           "WHERE id = %s", [self.code, json.dumps(self.info), self.submission.id])
+        self.assertEqual(self.codecs()[:2], (None, None))
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual((submission.code, submission.info), (self.code, self.info))
+
+        call_command("compress_submissions", sleep=0, stdout=io.StringIO())
+        self.assertEqual(self.codecs(), (ZSTD[0], ZSTD[0], None, None))
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual((submission.code, submission.info), (self.code, self.info))
+
+
+class SubmissionPartitionTest(QuizSubmissionPrepare):
+    def test_create_partitions(self):
+        partitions = list_partitions()
+        self.assertEqual(partitions[0][0], "submission_history")
+        # 迁移之前和当月的数据都在 submission_history 中
+        self.assertLess(self.submission.create_time, partitions[0][2])
+        self.assertEqual(partitions[-1][2], add_months(month_start(timezone.now()), 13))
+        self.assertEqual(create_partitions(), [])
+        self.assertEqual(len(create_partitions(months=13)), 1)
+
+    def test_default_partition(self):
+        def partition_of(submission_id):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT tableoid::regclass::text FROM submission WHERE id = %s", [submission_id])
+                return cursor.fetchone()[0]
+
+        # 超出已有分区范围的数据先写到 submission_default, 创建分区时移到新分区
+        create_time = add_months(month_start(timezone.now()), 13) + datetime.timedelta(days=1)
+        Submission.objects.filter(id=self.submission.id).update(create_time=create_time)
+        self.assertEqual(partition_of(self.submission.id), "submission_default")
+        self.assertEqual(create_partitions(months=13), [f"submission_{create_time.year}{create_time.month:02d}"])
+        self.assertEqual(partition_of(self.submission.id), f"submission_{create_time.year}{create_time.month:02d}")
+
+    def test_archive_partitions(self):
+        # 测试在事务中运行, 先触发延迟的外键检查, 否则不能在 submission_history 上加约束
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        history_end = list_partitions()[0][2]
+        self.assertEqual(archive_partitions(history_end), ["submission_history"])
+        self.assertEqual(list_partitions()[0][1], history_end)
+        self.assertFalse(Submission.objects.filter(id=self.submission.id).exists())
+        self.assertEqual(ArchivedSubmission.objects.get(id=self.submission.id).code, self.code)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_constraint WHERE conrelid = 'submission_history'::regclass "
+                           "AND contype = 'f'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        resp = self.client.get(self.reverse("submission_api"), data={"id": self.submission.id})
+        self.assertSuccess(resp)
+        self.assertEqual(resp.data["data"]["code"], self.code)
+
+        # 归档的提交不随题目删除
+        Problem.objects.filter(id=self.submission.problem_id).delete()
+        self.assertTrue(ArchivedSubmission.objects.filter(id=self.submission.id).exists())
+
+
+class SubmissionListSerializerTest(QuizSubmissionPrepare):
+    def test_show_link_queries(self):
+        contest = Contest.objects.create(title="test", description="test", real_time_rank=True, rule_type="ACM",
+                                         start_time=timezone.now() - datetime.timedelta(days=1),
+                                         end_time=timezone.now() + datetime.timedelta(days=1),
+                                         created_by=self.user)
+        user = self.create_user("123", "345", login=False)
+        expected = {self.submission.id: False}
+        for data, show_link in [({}, False), ({"shared": True}, True), ({"contest": contest, "shared": True}, False),
+                                ({"contest": contest}, False), ({"user_id": user.id}, True)]:
+            data = {"problem": self.submission.problem, "quiz": self.submission.quiz, "user_id": self.user.id,
+                    "username": self.user.username, "code": "", "language": "C", **data}
+            expected[Submission.objects.create(**data).id] = show_link
+
+        # 一次列表查询和一次 contest 查询, 与行数无关
+        with self.assertNumQueries(2):
+            data = SubmissionListSerializer(submission_list_queryset(), many=True, user=user).data
+        self.assertEqual({item["id"]: item["show_link"] for item in data}, expected)
+
+        super_admin = self.create_super_admin(login=False)
+        with self.assertNumQueries(1):
+            data = SubmissionListSerializer(submission_list_queryset(), many=True, user=super_admin).data
+        self.assertTrue(all(item["show_link"] for item in data))
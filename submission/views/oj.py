@@ -8,31 +8,47 @@ from options.options import SysOptions
 from problem.models import Problem, ProblemRuleType
 from utils.api import APIView, validate_serializer
 from utils.cache import cache
+from utils.constants import CacheKey
 from utils.captcha import Captcha
+from utils.shortcuts import keyword_filter
 from utils.throttling import TokenBucket
-from ..models import Submission
+from ..models import ArchivedSubmission, Submission
 from ..serializers import (CreateSubmissionSerializer, SubmissionModelSerializer,
                            ShareSubmissionSerializer)
 from ..serializers import SubmissionSafeModelSerializer, SubmissionListSerializer
 
+# 提交列表只读取 SubmissionListSerializer 和 check_user_permission 用到的字段,
+# code, info, ip 和 problem, quiz 的题面等大字段不再随列表读取
+SUBMISSION_LIST_FIELDS = ("id", "contest", "problem", "quiz", "create_time", "user_id", "username", "result",
+                          "language", "shared", "statistic_info",
+                          "problem___id", "problem__created_by", "problem__share_submission",
+                          "quiz__created_by", "quiz__share_submission")
+
+
+def submission_list_queryset(**filters):
+    return Submission.objects.filter(**filters).select_related("problem", "quiz").only(*SUBMISSION_LIST_FIELDS)
+
 
 class SubmissionAPI(APIView):
-    def throttling(self, request):
+    def throttling(self, request, check_ip=True):
         # 使用 open_api 的请求暂不做限制
         auth_method = getattr(request, "auth_method", "")
         if auth_method == "api_key":
             return
-        user_bucket = TokenBucket(key=str(request.user.id),
-                                  redis_conn=cache, **SysOptions.throttling["user"])
-        can_consume, wait = user_bucket.consume()
-        if not can_consume:
+        throttling = SysOptions.throttling
+        user_bucket = TokenBucket(key=f"{CacheKey.throttling}:user:{request.user.id}",
+                                  redis_conn=cache, **throttling["user"])
+        buckets = [user_bucket]
+        # 输入了验证码之后不再限制 ip
+        if check_ip:
+            buckets.append(TokenBucket(key=f"{CacheKey.throttling}:ip:{request.session['ip']}",
+                                       redis_conn=cache, **throttling["ip"]))
+        # 两个 bucket 在同一次 redis 请求中扣除
+        bucket, wait = TokenBucket.consume_all(buckets)
+        if bucket is user_bucket:
             return "Please wait %d seconds" % (int(wait))
-
-        # ip_bucket = TokenBucket(key=request.session["ip"],
-        #                         redis_conn=cache, **SysOptions.throttling["ip"])
-        # can_consume, wait = ip_bucket.consume()
-        # if not can_consume:
-        #     return "Captcha is required"
+        elif bucket is not None:
+            return "Captcha is required"
 
     @check_contest_permission(check_type="problems")
     def check_contest_permission(self, request):
@@ -61,7 +77,7 @@ class SubmissionAPI(APIView):
         if data.get("captcha"):
             if not Captcha(request).check(data["captcha"]):
                 return self.error("Invalid captcha")
-        error = self.throttling(request)
+        error = self.throttling(request, check_ip=not data.get("captcha"))
         if error:
             return self.error(error)
 
@@ -94,7 +110,11 @@ class SubmissionAPI(APIView):
         try:
             submission = Submission.objects.select_related("problem").get(id=submission_id)
         except Submission.DoesNotExist:
-            return self.error("Submission doesn't exist")
+            # 已经归档的旧分区
+            try:
+                submission = ArchivedSubmission.objects.select_related("problem").get(id=submission_id)
+            except ArchivedSubmission.DoesNotExist:
+                return self.error("Submission doesn't exist")
         if not submission.check_user_permission(request.user):
             return self.error("No permission for this submission")
 
@@ -132,7 +152,7 @@ class SubmissionListAPI(APIView):
         if request.GET.get("contest_id"):
             return self.error("Parameter error")
 
-        submissions = Submission.objects.filter(contest_id__isnull=True).select_related("problem__created_by")
+        submissions = submission_list_queryset(contest_id__isnull=True)
         problem_id = request.GET.get("problem_id")
         myself = request.GET.get("myself")
         result = request.GET.get("result")
@@ -146,10 +166,10 @@ class SubmissionListAPI(APIView):
         if (myself and myself == "1") or not SysOptions.submission_list_show_all:
             submissions = submissions.filter(user_id=request.user.id)
         elif username:
-            submissions = submissions.filter(username__icontains=username)
+            submissions = submissions.filter(keyword_filter(username, "username"))
         if result:
             submissions = submissions.filter(result=result)
-        data = self.paginate_data(request, submissions)
+        data = self.paginate_data(request, submissions, cursor_ordering=("-create_time", "-id"))
         data["results"] = SubmissionListSerializer(data["results"], many=True, user=request.user).data
         return self.success(data)
 
@@ -161,7 +181,7 @@ class ContestSubmissionListAPI(APIView):
             return self.error("Limit is needed")
 
         contest = self.contest
-        submissions = Submission.objects.filter(contest_id=contest.id).select_related("problem__created_by")
+        submissions = submission_list_queryset(contest_id=contest.id)
         problem_id = request.GET.get("problem_id")
         myself = request.GET.get("myself")
         result = request.GET.get("result")
@@ -176,7 +196,7 @@ class ContestSubmissionListAPI(APIView):
         if myself and myself == "1":
             submissions = submissions.filter(user_id=request.user.id)
         elif username:
-            submissions = submissions.filter(username__icontains=username)
+            submissions = submissions.filter(keyword_filter(username, "username"))
         if result:
             submissions = submissions.filter(result=result)
 
@@ -189,7 +209,7 @@ class ContestSubmissionListAPI(APIView):
             if not contest.real_time_rank and not request.user.is_contest_admin(contest):
                 submissions = submissions.filter(user_id=request.user.id)
 
-        data = self.paginate_data(request, submissions)
+        data = self.paginate_data(request, submissions, cursor_ordering=("-create_time", "-id"))
         data["results"] = SubmissionListSerializer(data["results"], many=True, user=request.user).data
         return self.success(data)
 
@@ -1,15 +1,73 @@
+import base64
+import binascii
+import datetime
+import decimal
 import functools
+import hashlib
 import json
 import logging
+import uuid
 
+from django.core.exceptions import ValidationError
+from django.db.models import DateTimeField, Q
 from django.http import HttpResponse, QueryDict
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import Promise
 from django.views.generic import View
 
+from utils.cache import cache
+from utils.constants import CacheKey
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger("")
 
 
+def _json_default(obj):
+    """
+    json 默认不支持的类型, datetime 的格式和 datetime2str 以及 rest_framework 一致
+    """
+    if isinstance(obj, datetime.datetime):
+        value = obj.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _StdlibJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        return _json_default(obj)
+
+
+def json_dumps(data, indent=None):
+    """
+    返回 utf-8 编码的 bytes, 安装了 orjson 时优先使用 orjson, 否则使用标准库
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(data, default=_json_default, option=option)
+        except TypeError:
+            # 例如超过 64 位的整数, 交给标准库处理
+            pass
+    separators = None if indent else (",", ":")
+    return json.dumps(data, indent=indent, separators=separators, ensure_ascii=False,
+                      cls=_StdlibJSONEncoder).encode("utf-8")
+
+
 class APIError(Exception):
     def __init__(self, msg, err=None):
         self.err = err
@@ -29,6 +87,8 @@ class JSONParser(object):
 
     @staticmethod
     def parse(body):
+        if orjson is not None:
+            return orjson.loads(body)
         return json.loads(body.decode("utf-8"))
 
 
@@ -42,10 +102,12 @@ class URLEncodedParser(object):
 
 class JSONResponse(object):
     content_type = ContentType.json_response
+    # 默认输出紧凑的 json, 需要格式化输出时可以继承并修改 indent, 然后设置为 APIView.response_class
+    indent = None
 
     @classmethod
     def response(cls, data):
-        resp = HttpResponse(json.dumps(data, indent=4), content_type=cls.content_type)
+        resp = HttpResponse(json_dumps(data, indent=cls.indent), content_type=cls.content_type)
         resp.data = data
         return resp
 
@@ -110,19 +172,27 @@ class APIView(View):
     def server_error(self):
         return self.error(err="server-error", msg="server error")
 
-    def paginate_data(self, request, query_set, object_serializer=None):
-        """
-        :param request: django的request
-        :param query_set: django model的query set或者其他list like objects
-        :param object_serializer: 用来序列化query set, 如果为None, 则直接对query set切片
-        :return:
-        """
+    @staticmethod
+    def _get_limit(request):
         try:
             limit = int(request.GET.get("limit", "10"))
         except ValueError:
             limit = 10
         if limit < 0 or limit > 250:
             limit = 10
+        return limit
+
+    def paginate_data(self, request, query_set, object_serializer=None, cursor_ordering=None):
+        """
+        :param request: django的request
+        :param query_set: django model的query set或者其他list like objects
+        :param object_serializer: 用来序列化query set, 如果为None, 则直接对query set切片
+        :param cursor_ordering: 支持游标分页的排序字段, 例如 ("-create_time", "-id"), 请求中有 cursor 参数时使用游标分页
+        :return:
+        """
+        if cursor_ordering and "cursor" in request.GET:
+            return self.paginate_data_by_cursor(request, query_set, cursor_ordering, object_serializer)
+        limit = self._get_limit(request)
         try:
             offset = int(request.GET.get("offset", "0"))
         except ValueError:
@@ -139,6 +209,103 @@ class APIView(View):
                 "total": count}
         return data
 
+    @staticmethod
+    def _encode_cursor(row, ordering, reverse):
+        values = []
+        for field in ordering:
+            value = getattr(row, field.lstrip("-"))
+            values.append(value.isoformat() if isinstance(value, datetime.datetime) else value)
+        return base64.urlsafe_b64encode(json.dumps({"v": values, "r": reverse}).encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def _decode_cursor(cursor, ordering, query_set):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+            values, reverse = data["v"], bool(data["r"])
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+            raise APIError("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise APIError("Invalid cursor")
+        # cursor 来自客户端, 每个值都按照字段类型解析, 只接受 json 中的标量
+        parsed = []
+        for field_name, value in zip(ordering, values):
+            if value is None or isinstance(value, (dict, list)):
+                raise APIError("Invalid cursor")
+            name = field_name.lstrip("-")
+            if name in query_set.query.annotations:
+                field = query_set.query.annotations[name].output_field
+            else:
+                field = query_set.model._meta.get_field(name)
+            try:
+                if isinstance(field, DateTimeField):
+                    value = parse_datetime(value)
+                    if value is None or timezone.is_naive(value):
+                        raise ValueError(value)
+                else:
+                    value = field.to_python(value)
+            except (ValidationError, ValueError, TypeError):
+                raise APIError("Invalid cursor")
+            parsed.append(value)
+        return parsed, reverse
+
+    @staticmethod
+    def _cursor_filter(ordering, values, reverse):
+        # (a, b) < (va, vb) 展开为 a < va or (a = va and b < vb)
+        query = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") != reverse else "gt"
+            query |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return query
+
+    @staticmethod
+    def _cached_count(query_set, timeout=60):
+        # str(query) 拼接参数时不加引号, 不同的查询可能得到相同的字符串
+        sql = repr(query_set.query.sql_with_params())
+        key = f"{CacheKey.paginate_count}:{hashlib.md5(sql.encode('utf-8')).hexdigest()}"
+        count = cache.get(key)
+        if count is None:
+            count = query_set.count()
+            cache.set(key, count, timeout=timeout)
+        return count
+
+    def paginate_data_by_cursor(self, request, query_set, ordering, object_serializer=None):
+        """
+        游标分页, 不使用 OFFSET, 翻到多深都只需要按索引读取 limit 条数据
+         - request.GET["cursor"] 为上一次返回的 next 或者 prev, 为空表示第一页
+         - ordering 中的字段组合必须唯一, 例如 ("-create_time", "-id")
+         - total 缓存 60 秒, 是近似值
+        """
+        limit = self._get_limit(request)
+        total = self._cached_count(query_set)
+        cursor = request.GET.get("cursor")
+        reverse = False
+        if cursor:
+            values, reverse = self._decode_cursor(cursor, ordering, query_set)
+            query_set = query_set.filter(self._cursor_filter(ordering, values, reverse))
+        if reverse:
+            query_set = query_set.order_by(*[field[1:] if field.startswith("-") else "-" + field for field in ordering])
+        else:
+            query_set = query_set.order_by(*ordering)
+        # 多取一条用来判断是否还有下一页
+        results = list(query_set[:limit + 1])
+        has_more = len(results) > limit
+        results = results[:limit]
+        if reverse:
+            results.reverse()
+
+        next_cursor = prev_cursor = None
+        if results:
+            if has_more or reverse:
+                next_cursor = self._encode_cursor(results[-1], ordering, False)
+            if cursor and (has_more or not reverse):
+                prev_cursor = self._encode_cursor(results[0], ordering, True)
+        if object_serializer:
+            results = object_serializer(results, many=True).data
+        return {"results": results, "total": total, "next": next_cursor, "prev": prev_cursor}
+
     def dispatch(self, request, *args, **kwargs):
         if self.request_parsers:
             try:
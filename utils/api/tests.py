@@ -1,13 +1,37 @@
+import base64
+import datetime
+import decimal
+import json
+from unittest import mock
+
+from django.test import RequestFactory
 from django.urls import reverse
-from django.test.testcases import TestCase
+from django.test.testcases import SimpleTestCase, TestCase
 from rest_framework.test import APIClient
 
 from account.models import AdminType, ProblemPermission, User, UserProfile
+from options.options import SysOptions
+from utils.cache import cache
+from utils.constants import CacheKey
+from .api import APIError, APIView, JSONResponse, json_dumps
 
 
 class APITestCase(TestCase):
     client_class = APIClient
 
+    def tearDown(self):
+        # 测试结束后数据库回滚, 进程内的配置缓存也要失效
+        SysOptions.invalidate_cache()
+        # 限流的计数, 用户的 session, 分页的数量, 题目列表和排名保存在 redis 中, 不会随数据库回滚
+        for key in [CacheKey.throttling, CacheKey.user_sessions, CacheKey.session_activity, CacheKey.paginate_count,
+                    CacheKey.problem_list, CacheKey.problem_detail, CacheKey.problem_pick, CacheKey.quiz_pick,
+                    CacheKey.user_rank]:
+            cache.delete_pattern(f"{key}:*")
+        cache.delete_many([CacheKey.user_rank_built, CacheKey.user_rank_rebuilding])
+        # PickOne 在进程内按版本号缓存, 版本号加一之后不再使用回滚之前的数据
+        cache.redis_incr(CacheKey.problem_list_version)
+        cache.redis_incr(CacheKey.quiz_pick_version)
+
     def create_user(self, username, password, admin_type=AdminType.REGULAR_USER, login=True,
                     problem_permission=ProblemPermission.NONE):
         user = User.objects.create(username=username, admin_type=admin_type, problem_permission=problem_permission)
@@ -38,3 +62,80 @@ class APITestCase(TestCase):
         self.assertTrue(response.data["error"] is not None)
         if msg:
             self.assertEqual(response.data["data"], msg)
+
+
+class JSONResponseTest(SimpleTestCase):
+    data = {"error": None, "data": {"time": datetime.datetime(2022, 10, 18, 12, 40, tzinfo=datetime.timezone.utc),
+                                    "date": datetime.date(2022, 10, 18), "score": decimal.Decimal("99.5"),
+                                    "name": "测试", 1: [1, 2]}}
+    expected = {"error": None, "data": {"time": "2022-10-18T12:40:00Z", "date": "2022-10-18", "score": "99.5",
+                                        "name": "测试", "1": [1, 2]}}
+
+    def test_compact_response(self):
+        resp = JSONResponse.response(self.data)
+        self.assertNotIn(b"\n", resp.content)
+        self.assertNotIn(b": ", resp.content)
+        self.assertEqual(json.loads(resp.content), self.expected)
+        self.assertIs(resp.data, self.data)
+
+    def test_stdlib_fallback(self):
+        content = json_dumps(self.data)
+        with mock.patch("utils.api.api.orjson", None):
+            self.assertEqual(json_dumps(self.data), content)
+            self.assertEqual(json.loads(json_dumps(self.data, indent=4)), self.expected)
+
+
+class CursorPaginationTest(APITestCase):
+    ordering = ("-create_time", "-id")
+
+    def setUp(self):
+        for i in range(5):
+            self.create_user(f"user{i}", "password", login=False)
+        self.query_set = User.objects.all()
+        self.expected = [user.id for user in self.query_set.order_by(*self.ordering)]
+
+    def _get(self, **params):
+        request = RequestFactory().get("/", data=params)
+        return APIView().paginate_data(request, self.query_set, cursor_ordering=self.ordering)
+
+    def test_offset_mode_without_cursor(self):
+        data = self._get(limit=2, offset=2)
+        self.assertNotIn("next", data)
+        self.assertEqual(data["total"], 5)
+
+    def test_next_and_prev(self):
+        page1 = self._get(limit=2, cursor="")
+        self.assertEqual([user.id for user in page1["results"]], self.expected[:2])
+        self.assertIsNone(page1["prev"])
+        self.assertEqual(page1["total"], 5)
+
+        page2 = self._get(limit=2, cursor=page1["next"])
+        self.assertEqual([user.id for user in page2["results"]], self.expected[2:4])
+        page3 = self._get(limit=2, cursor=page2["next"])
+        self.assertEqual([user.id for user in page3["results"]], self.expected[4:])
+        self.assertIsNone(page3["next"])
+
+        back = self._get(limit=2, cursor=page3["prev"])
+        self.assertEqual([user.id for user in back["results"]], self.expected[2:4])
+        back = self._get(limit=2, cursor=back["prev"])
+        self.assertEqual([user.id for user in back["results"]], self.expected[:2])
+        self.assertIsNone(back["prev"])
+        self.assertEqual(back["next"], page1["next"])
+
+    def test_invalid_cursor(self):
+        def encode(values):
+            return base64.urlsafe_b64encode(json.dumps({"v": values, "r": False}).encode("utf-8")).decode("utf-8")
+
+        create_time = self.query_set.first().create_time.isoformat()
+        for cursor in ["invalid", "a", base64.urlsafe_b64encode(b"\xff").decode("utf-8"),
+                       encode([create_time]), encode([{"a": 1}, "id"]), encode([create_time, ["id"]]),
+                       encode(["2020-13-01T00:00:00Z", "id"]), encode(["2020-01-01T00:00:00", "id"]),
+                       encode([create_time, "id"]), encode([create_time, None])]:
+            with self.assertRaises(APIError, msg=cursor):
+                self._get(limit=2, cursor=cursor)
+
+    def test_cached_count(self):
+        # str(query) 中这两个查询相同
+        self.create_user("a, b", "password", login=False)
+        self.assertEqual(APIView._cached_count(User.objects.filter(username__in=["a, b"])), 1)
+        self.assertEqual(APIView._cached_count(User.objects.filter(username__in=["a", "b"])), 0)
@@ -1,5 +1,8 @@
+import random
+
 from django.core.cache import cache, caches  # noqa
 from django.conf import settings  # noqa
+from django.db import transaction
 
 from django_redis.cache import RedisCache
 from django_redis.client.default import DefaultClient
@@ -25,3 +28,58 @@ class MyRedisCache(RedisCache):
 
     def __getattr__(self, item):
         return getattr(self.client, item)
+
+
+class PickCache(object):
+    """
+    PickOneAPI 使用的公开可见题目 id, 按难度分组: {difficulty: [(id, _id), ...]}
+     - key 中包含 version_key 的值, 版本号加一之后旧的列表不再使用, 等待过期
+     - 每个进程保存当前版本的一份, 版本号不变时不需要再读取 redis 中的列表
+    子类需要设置 model, key 和 version_key
+    """
+    model = None
+    key = None
+    version_key = None
+    ttl = 3600
+    _local = (None, None)
+
+    @classmethod
+    def _load(cls):
+        version = cache.get(cls.version_key) or 0
+        local_version, data = cls._local
+        if local_version == version:
+            return data
+        key = f"{cls.key}:{version}"
+        data = cache.get(key)
+        if data is None:
+            data = {}
+            for pk, display_id, difficulty in cls.model.objects.filter(contest_id__isnull=True, visible=True) \
+                    .values_list("id", "_id", "difficulty"):
+                data.setdefault(difficulty, []).append((pk, display_id))
+            cache.set(key, data, timeout=cls.ttl)
+        cls._local = (version, data)
+        return data
+
+    @classmethod
+    def pick(cls, difficulty=None, exclude=()):
+        """
+        随机返回一个题目的 _id, 没有可选的题目时返回 None
+        :param exclude: 不选择的题目 id 集合, 比如已经通过的题目
+        """
+        data = cls._load()
+        candidates = data.get(difficulty, []) if difficulty else [item for items in data.values() for item in items]
+        # 大部分题目没有被排除时随机几次就能选到, 否则再过滤
+        for _ in range(8):
+            if not candidates:
+                return None
+            pk, display_id = random.choice(candidates)
+            if pk not in exclude:
+                return display_id
+        candidates = [item for item in candidates if item[0] not in exclude]
+        return random.choice(candidates)[1] if candidates else None
+
+    @classmethod
+    def invalidate(cls):
+        cache.redis_incr(cls.version_key)
+        # 事务提交前其他请求可能又缓存了旧的数据
+        transaction.on_commit(lambda: cache.redis_incr(cls.version_key))
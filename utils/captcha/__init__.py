@@ -11,15 +11,68 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import functools
 import os
 import time
 import random
 
 from PIL import Image, ImageDraw, ImageFont
 
+from utils.cache import cache
+from utils.constants import CacheKey
+from utils.shortcuts import img2base64
+
+FONT_PATH = os.path.join(os.path.normpath(os.path.dirname(__file__)), "timesbi.ttf").replace("\\", "/")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(size):
+    """
+    每个进程中每种字号只加载一次字体文件
+    """
+    return ImageFont.truetype(FONT_PATH, size)
+
+
+class CaptchaPool(object):
+    """
+    预先生成的验证码池, 保存在 redis list 中, 每一项为 "答案:base64 图片", 每张图片只会被使用一次
+    数量低于一半时由 utils.tasks.refill_captcha_pool 在后台补充
+    """
+    size = 500
+    batch_size = 50
+
+    @classmethod
+    def pop(cls):
+        pipe = cache.pipeline()
+        pipe.lpop(CacheKey.captcha_pool)
+        pipe.llen(CacheKey.captcha_pool)
+        item, remaining = pipe.execute()
+        if remaining < cls.size // 2 and cache.add(CacheKey.captcha_pool_refilling, 1, timeout=60):
+            from utils.tasks import refill_captcha_pool
+            refill_captcha_pool.send()
+        if item is None:
+            return None
+        answer, img = item.decode("utf-8").split(":", 1)
+        return answer, img
+
+    @classmethod
+    def refill(cls):
+        captcha = Captcha()
+        try:
+            count = cls.size - cache.llen(CacheKey.captcha_pool)
+            while count > 0:
+                items = []
+                for _ in range(min(count, cls.batch_size)):
+                    answer, image = captcha.render()
+                    items.append(f"{answer}:{img2base64(image)}")
+                cache.rpush(CacheKey.captcha_pool, *items)
+                count -= len(items)
+        finally:
+            cache.delete(CacheKey.captcha_pool_refilling)
+
 
 class Captcha(object):
-    def __init__(self, request):
+    def __init__(self, request=None):
         """
         初始化,设置各种属性
         """
@@ -50,19 +103,15 @@ class Captcha(object):
         """
         生成随机数或随机字符串
         """
-        string = random.sample("abcdefghkmnpqrstuvwxyzABCDEFGHGKMNOPQRSTUVWXYZ23456789", 4)
-        self._set_answer("".join(string))
-        return string
+        return random.sample("abcdefghkmnpqrstuvwxyzABCDEFGHGKMNOPQRSTUVWXYZ23456789", 4)
 
-    def get(self):
+    def render(self):
         """
-        生成验证码图片,返回值为图片的bytes
+        生成验证码图片, 返回答案和图片, 不依赖 request, 可以在后台预先生成
         """
         background = (random.randrange(200, 255), random.randrange(200, 255), random.randrange(200, 255))
         code_color = (random.randrange(0, 50), random.randrange(0, 50), random.randrange(0, 50), 255)
 
-        font_path = os.path.join(os.path.normpath(os.path.dirname(__file__)), "timesbi.ttf")
-
         image = Image.new("RGB", (self.img_width, self.img_height), background)
         code = self._make_code()
         font_size = self._get_font_size(code)
@@ -75,13 +124,24 @@ class Captcha(object):
             # 字符y坐标
             y = random.randrange(1, 7)
             # 随机字符大小
-            font = ImageFont.truetype(font_path.replace("\\", "/"), font_size + random.randrange(-3, 7))
+            font = _load_font(font_size + random.randrange(-3, 7))
             draw.text((x, y), i, font=font, fill=code_color)
             # 随机化字符之间的距离 字符粘连可以降低识别率
             x += font_size * random.randrange(6, 8) / 10
 
-        self.django_request.session[self.session_key] = "".join(code)
-        return image
+        return "".join(code), image
+
+    def get(self):
+        """
+        从验证码池中取出一张图片, 池为空时直接生成, 返回值为 base64 编码的图片
+        """
+        item = CaptchaPool.pop()
+        if item is None:
+            answer, image = self.render()
+            item = answer, img2base64(image)
+        answer, img = item
+        self._set_answer(answer)
+        return img
 
     def check(self, code):
         """
@@ -0,0 +1,115 @@
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 保存的数据第一个字节是编码方式
+RAW = b"\x00"
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+# 太短的内容压缩后不会更小, 直接保存
+MIN_COMPRESS_SIZE = 64
+ZSTD_LEVEL = 3
+DICTIONARY_SIZE = 112640
+
+
+class Dictionaries:
+    """
+    zstd 字典保存在 options.models.CompressionDictionary 中, 所有机器和备份看到的都是同一份.
+    压缩时使用同一个 name 中最新的字典, 解压时按照 zstd frame 中的 dict_id 查找
+    """
+    reload_interval = 300
+    _lock = threading.Lock()
+    _by_id = {}
+    _latest = {}
+    _loaded_at = 0
+
+    @classmethod
+    def _load(cls):
+        from options.models import CompressionDictionary
+
+        items = list(CompressionDictionary.objects.order_by("create_time").values_list("id", "name"))
+        # 字典不会修改, 已经加载过的不再读取
+        by_id = dict(cls._by_id)
+        missing = [dict_id for dict_id, _ in items if dict_id not in by_id]
+        for dict_id, data in CompressionDictionary.objects.filter(id__in=missing).values_list("id", "data"):
+            by_id[dict_id] = zstandard.ZstdCompressionDict(bytes(data))
+        latest = {name: dict_id for dict_id, name in items}
+        with cls._lock:
+            cls._by_id, cls._latest, cls._loaded_at = by_id, latest, time.time()
+
+    @classmethod
+    def latest(cls, name):
+        # 其他进程训练的新字典在 reload_interval 之内生效
+        if time.time() - cls._loaded_at > cls.reload_interval:
+            cls._load()
+        dict_id = cls._latest.get(name)
+        return cls._by_id[dict_id] if dict_id else None
+
+    @classmethod
+    def get(cls, dict_id):
+        if dict_id not in cls._by_id:
+            cls._load()
+        try:
+            return cls._by_id[dict_id]
+        except KeyError:
+            raise ValueError(f"Compression dictionary {dict_id} does not exist")
+
+    @classmethod
+    def train(cls, name, samples, size=DICTIONARY_SIZE):
+        """
+        使用 samples(bytes 列表) 训练新的字典并保存, 之后压缩的数据都会使用它, 返回 dict_id
+        """
+        from options.models import CompressionDictionary
+
+        data = zstandard.train_dictionary(size, samples, level=ZSTD_LEVEL).as_bytes()
+        dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+        CompressionDictionary.objects.get_or_create(id=dict_id, defaults={"name": name, "data": data})
+        cls._load()
+        return dict_id
+
+
+# ZstdCompressor 和 ZstdDecompressor 不是线程安全的, 每个线程按字典缓存
+_local = threading.local()
+
+
+def _zstd(kind, dictionary):
+    cache = _local.__dict__.setdefault(kind, {})
+    key = dictionary.dict_id() if dictionary else 0
+    if key not in cache:
+        if kind == "compressor":
+            cache[key] = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+        else:
+            cache[key] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return cache[key]
+
+
+def compress(data, dictionary=None):
+    """
+    :param data: bytes
+    :param dictionary: 字典的 name, 没有训练过这个字典时不使用字典
+    没有安装 zstandard 时使用 zlib
+    """
+    if len(data) < MIN_COMPRESS_SIZE:
+        return RAW + data
+    if zstandard is None:
+        return ZLIB + zlib.compress(data)
+    return ZSTD + _zstd("compressor", Dictionaries.latest(dictionary) if dictionary else None).compress(data)
+
+
+def decompress(value):
+    codec, data = value[:1], value[1:]
+    if codec == RAW:
+        return data
+    if codec == ZLIB:
+        return zlib.decompress(data)
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd compressed data")
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        return _zstd("decompressor", Dictionaries.get(dict_id) if dict_id else None).decompress(data)
+    raise ValueError(f"Unknown compression codec {codec!r}")
@@ -25,6 +25,28 @@ class CacheKey:
     waiting_queue = "waiting_queue"
     contest_rank_cache = "contest_rank_cache"
     website_config = "website_config"
+    test_case_dirs = "test_case_dirs"
+    test_case_refs = "test_case_refs"
+    test_case_index_built = "test_case_index_built"
+    test_case_prune_progress = "test_case_prune_progress"
+    options_version = "options_version"
+    options_channel = "options_invalidation"
+    throttling = "throttling"
+    captcha_pool = "captcha_pool"
+    captcha_pool_refilling = "captcha_pool_refilling"
+    user_sessions = "user_sessions"
+    session_activity = "session_activity"
+    open_api_appkey = "open_api_appkey"
+    user_rank = "user_rank"
+    user_rank_built = "user_rank_built"
+    user_rank_rebuilding = "user_rank_rebuilding"
+    paginate_count = "paginate_count"
+    problem_list = "problem_list"
+    problem_list_version = "problem_list_version"
+    problem_detail = "problem_detail"
+    problem_pick = "problem_pick"
+    quiz_pick = "quiz_pick"
+    quiz_pick_version = "quiz_pick_version"
 
 
 class Difficulty(Choices):
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from conf.test_case_index import TestCaseIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuild the test case reference index from TEST_CASE_DIR and the database"
+
+    def handle(self, *args, **options):
+        TestCaseIndex.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Index rebuilt, {len(TestCaseIndex.orphan_ids())} orphan test case(s)"))
@@ -1,6 +1,8 @@
 from django.db.models import JSONField  # NOQA
 from django.db import models
+from django.db.models.expressions import Col
 
+from utils.compression import compress, decompress
 from utils.xss_filter import XSSHtml
 
 
@@ -8,3 +10,63 @@ class RichTextField(models.TextField):
     def get_prep_value(self, value):
         with XSSHtml() as parser:
             return parser.clean(value or "")
+
+
+class LegacyCol(Col):
+    """
+    压缩列还没有回填的行从原来未压缩的列读取, 转换为 utils.compression.RAW 格式
+    """
+    def as_sql(self, compiler, connection):
+        sql, params = super().as_sql(compiler, connection)
+        legacy = compiler.quote_name_unless_alias(self.target.legacy_column)
+        if self.alias:
+            legacy = f"{compiler.quote_name_unless_alias(self.alias)}.{legacy}"
+        return f"COALESCE({sql}, decode('00', 'hex') || convert_to({legacy}::text, 'UTF8'))", params
+
+
+class CompressedFieldMixin:
+    """
+    压缩后以 bytea 保存, 读取时自动解压, 不能用于过滤和排序
+    dictionary 是 utils.compression.Dictionaries 中 zstd 字典的 name
+    legacy_column 是原来未压缩的列, 新数据只写压缩列, 读取时压缩列为 NULL 则读原来的列
+    """
+    def __init__(self, *args, dictionary=None, legacy_column=None, **kwargs):
+        self.dictionary = dictionary
+        self.legacy_column = legacy_column
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dictionary:
+            kwargs["dictionary"] = self.dictionary
+        if self.legacy_column:
+            kwargs["legacy_column"] = self.legacy_column
+        return name, path, args, kwargs
+
+    def get_col(self, alias, output_field=None):
+        if not self.legacy_column:
+            return super().get_col(alias, output_field)
+        return LegacyCol(alias, self, output_field)
+
+    def db_type(self, connection):
+        return "bytea"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return value
+        return connection.Database.Binary(compress(value.encode("utf-8"), self.dictionary))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress(bytes(value)).decode("utf-8")
+
+
+class CompressedTextField(CompressedFieldMixin, models.TextField):
+    pass
+
+
+class CompressedJSONField(CompressedFieldMixin, JSONField):
+    def from_db_value(self, value, expression, connection):
+        return JSONField.from_db_value(self, super().from_db_value(value, expression, connection), expression, connection)
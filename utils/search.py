@@ -0,0 +1,78 @@
+"""
+题目和 quiz 的全文搜索, 使用 search_vector 上的 GIN 索引
+ - _id 和标题的权重为 A, 标签为 B, 描述为 C, 描述中的 HTML 标签和实体会被去掉
+ - 使用 simple 配置, 不做词干处理, 关键词中的每个词按前缀匹配
+ - 中文没有空格分词, 关键词中有中文时使用 title 上的 trigram 索引做子串匹配
+search_vector 由 utils.signals.TaggedModelSignals 在保存和标签修改之后更新
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+
+# 标点都替换为空格, 否则 A-112 会被解析为 a 和 -112 两个词
+# 标签先按行聚合, 重建所有行时不会对每一行执行子查询
+UPDATE_SQL = """
+UPDATE {table} SET search_vector =
+    setweight(to_tsvector('simple', regexp_replace({table}._id || ' ' || {table}.title, '[[:punct:]]+', ' ', 'g')), 'A') ||
+    setweight(to_tsvector('simple', regexp_replace(coalesce(tags.names, ''), '[[:punct:]]+', ' ', 'g')), 'B') ||
+    setweight(to_tsvector('simple', regexp_replace(regexp_replace({table}.description, '<[^>]*>|&[a-z]+;', ' ', 'g'),
+                                                   '[[:punct:]]+', ' ', 'g')), 'C')
+FROM (
+    SELECT {table}.id, string_agg({tag_table}.name, ' ') AS names FROM {table}
+    LEFT JOIN {through} ON {through}.{column} = {table}.id
+    LEFT JOIN {tag_table} ON {tag_table}.id = {through}.{tag_column}
+    {where}
+    GROUP BY {table}.id
+) AS tags
+WHERE tags.id = {table}.id
+"""
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+class FullTextSearch(object):
+    """
+    子类需要设置 model, model 需要有 _id, title, description, tags 和 search_vector 字段
+    """
+    model = None
+    # 和 cursor_ordering 一起使用, id 保证顺序唯一
+    ordering = ("-rank", "-id")
+
+    @classmethod
+    def _update_sql(cls, where):
+        table = cls.model._meta.db_table
+        tags = cls.model._meta.get_field("tags")
+        return UPDATE_SQL.format(table=table, tag_table=tags.related_model._meta.db_table,
+                                 through=tags.remote_field.through._meta.db_table,
+                                 column=tags.m2m_column_name(), tag_column=tags.m2m_reverse_name(),
+                                 where=where.format(table=table))
+
+    @classmethod
+    def update_search_vector(cls, ids=None):
+        """
+        ids 为 None 时更新所有行
+        """
+        with connection.cursor() as cursor:
+            if ids is None:
+                cursor.execute(cls._update_sql(""))
+            else:
+                cursor.execute(cls._update_sql("WHERE {table}.id = ANY(%s)"), [list(ids)])
+
+    @classmethod
+    def search(cls, query_set, keyword):
+        """
+        返回 query_set 中匹配 keyword 的行, 添加了 rank 字段并按照 ordering 排序
+        """
+        if CJK_RE.search(keyword):
+            return query_set.filter(title__icontains=keyword) \
+                .annotate(rank=Value(1.0, output_field=FloatField())).order_by(*cls.ordering)
+        words = WORD_RE.findall(keyword.lower())
+        if not words:
+            return query_set.none()
+        query = SearchQuery(" & ".join(f"'{word}':*" for word in words), config="simple", search_type="raw")
+        # ts_rank 返回 real, 转为 double 之后游标中的值才能精确比较
+        rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+        return query_set.filter(search_vector=query).annotate(rank=rank).order_by(*cls.ordering)
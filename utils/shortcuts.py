@@ -2,9 +2,13 @@ import os
 import re
 import datetime
 import random
+import secrets
+import threading
+import time
 from base64 import b64encode
 from io import BytesIO
 
+from django.db.models import Q
 from django.utils.crypto import get_random_string
 from envelopes import Envelope
 
@@ -26,6 +30,38 @@ def rand_str(length=32, type="lower_hex"):
         return random.choice("123456789") + get_random_string(length - 1, allowed_chars="0123456789")
 
 
+_time_ordered_id_lock = threading.Lock()
+_last_time_ordered_id = [0, 0]
+
+
+def time_ordered_id():
+    """
+    按时间递增的 id, 格式和 rand_str() 相同, 是 32 位小写十六进制字符串
+    前 12 位是毫秒时间戳, 后 20 位是随机数; 同一进程中同一毫秒内生成的 id 在随机数上递增, 保证单调
+    作为主键时新数据总是插入到索引的最右侧, 也可以用 id 的范围代替时间范围
+    """
+    with _time_ordered_id_lock:
+        timestamp = int(time.time() * 1000)
+        last_timestamp, last_randomness = _last_time_ordered_id
+        if timestamp <= last_timestamp:
+            timestamp, randomness = last_timestamp, last_randomness + 1
+            if randomness >= 1 << 80:
+                timestamp, randomness = timestamp + 1, secrets.randbits(79)
+        else:
+            # 留出一半的空间给同一毫秒内的递增
+            randomness = secrets.randbits(79)
+        _last_time_ordered_id[:] = [timestamp, randomness]
+    return f"{timestamp:012x}{randomness:020x}"
+
+
+def time_ordered_id_bound(dt):
+    """
+    dt 时刻之后生成的 time_ordered_id() 都不小于这个值, 例如 id__gte=time_ordered_id_bound(start_time)
+    只对使用 time_ordered_id() 生成的 id 有效
+    """
+    return f"{int(dt.timestamp() * 1000):012x}" + "0" * 20
+
+
 def build_query_string(kv_data, ignore_none=True):
     # {"a": 1, "b": "test"} -> "?a=1&b=test"
     query_string = ""
@@ -92,3 +128,18 @@ def check_is_id(value):
         return int(value) > 0
     except Exception:
         return False
+
+
+def keyword_filter(keyword, *fields):
+    """
+    在多个字段中搜索子串, 对应的 pg_trgm 索引见 account 和 submission 的 migrations
+    以 ^ 开头时只匹配前缀, 可以使用 text_pattern_ops 索引, 并且不受 pg_trgm 至少 3 个字符的限制
+    """
+    if keyword.startswith("^"):
+        lookup, keyword = "istartswith", keyword[1:]
+    else:
+        lookup = "icontains"
+    query = Q()
+    for field in fields:
+        query |= Q(**{f"{field}__{lookup}": keyword})
+    return query
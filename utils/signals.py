@@ -0,0 +1,68 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+
+
+class TaggedModelSignals(object):
+    """
+    题目和 quiz 共用的信号处理, 保存, 删除和修改标签之后
+     - 更新标签的数量和全文搜索的 search_vector
+     - 公开的行被修改时清除 cache, 例如列表或者 PickOne 的缓存
+    子类需要设置 model, search, cache 和 refresh_tag_count, 然后在 AppConfig.ready 中调用 connect()
+    """
+    model = None
+    # utils.search.FullTextSearch 的子类
+    search = None
+    # 有 invalidate() 的缓存类
+    cache = None
+    # 判题时只更新这些计数, 不影响标签的数量, 全文搜索和缓存
+    counter_fields = ("submission_number", "accepted_number", "statistic_info")
+
+    @staticmethod
+    def refresh_tag_count(tag_ids):
+        raise NotImplementedError()
+
+    @classmethod
+    def only_counters(cls, update_fields):
+        return bool(update_fields) and set(update_fields) <= set(cls.counter_fields)
+
+    @classmethod
+    def saved(cls, sender, instance, created=False, update_fields=None, **kwargs):
+        if cls.only_counters(update_fields):
+            return
+        if instance.contest_id is None:
+            cls.cache.invalidate()
+        cls.search.update_search_vector([instance.id])
+        # visible 和 contest 的变化会影响标签的数量, 新建的行还没有标签
+        if not created:
+            cls.refresh_tag_count(instance.tags.values_list("id", flat=True))
+
+    @classmethod
+    def deleting(cls, sender, instance, **kwargs):
+        # 删除时 m2m 的行被级联删除, 不会发送 m2m_changed
+        instance._deleted_tag_ids = list(instance.tags.values_list("id", flat=True))
+
+    @classmethod
+    def deleted(cls, sender, instance, **kwargs):
+        if instance.contest_id is None:
+            cls.cache.invalidate()
+        cls.refresh_tag_count(instance._deleted_tag_ids)
+
+    @classmethod
+    def tags_changed(cls, sender, instance, action, reverse, pk_set=None, **kwargs):
+        if action == "pre_clear":
+            instance._cleared_tag_ids = list(instance.tags.values_list("id", flat=True)) if not reverse else [instance.id]
+            return
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        if action == "post_clear":
+            cls.refresh_tag_count(instance._cleared_tag_ids)
+        else:
+            cls.refresh_tag_count(pk_set if not reverse else [instance.id])
+        cls.search.update_search_vector([instance.id] if not reverse else pk_set or [])
+        cls.cache.invalidate()
+
+    @classmethod
+    def connect(cls):
+        post_save.connect(cls.saved, sender=cls.model)
+        pre_delete.connect(cls.deleting, sender=cls.model)
+        post_delete.connect(cls.deleted, sender=cls.model)
+        m2m_changed.connect(cls.tags_changed, sender=cls.model.tags.through)
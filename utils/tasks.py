@@ -1,6 +1,7 @@
 import os
 import dramatiq
 
+from utils.captcha import CaptchaPool
 from utils.shortcuts import DRAMATIQ_WORKER_ARGS
 
 
@@ -11,3 +12,8 @@ def delete_files(*args):
             os.remove(item)
         except Exception:
             pass
+
+
+@dramatiq.actor(**DRAMATIQ_WORKER_ARGS())
+def refill_captcha_pool():
+    CaptchaPool.refill()
@@ -1,9 +1,79 @@
 import time
 
+from utils.shortcuts import rand_str
+
+# KEYS: 每个 bucket 的 key
+# ARGV: now, num, 然后每个 bucket 依次是 capacity, fill_rate, default_capacity
+# 只有所有 bucket 的 token 都足够时才会扣除, 否则返回第一个不足的 bucket 的序号(从 1 开始)和需要等待的秒数
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local num = tonumber(ARGV[2])
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 3
+    local capacity = tonumber(ARGV[base + 1])
+    local fill_rate = tonumber(ARGV[base + 2])
+    local state = redis.call("HMGET", key, "last_capacity", "last_timestamp")
+    local last_capacity = tonumber(state[1])
+    local last_timestamp = tonumber(state[2])
+    if last_capacity == nil or last_timestamp == nil then
+        last_capacity = tonumber(ARGV[base + 3])
+        last_timestamp = now
+    end
+    local current = math.min(capacity, last_capacity + math.max(0, now - last_timestamp) * fill_rate)
+    if current < num then
+        return {i, tostring((num - current) / fill_rate)}
+    end
+    tokens[i] = current - num
+end
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 3
+    redis.call("HMSET", key, "last_capacity", tostring(tokens[i]), "last_timestamp", tostring(now))
+    -- 过了这个时间 bucket 已经填满, 不需要再保存
+    redis.call("EXPIRE", key, math.ceil(tonumber(ARGV[base + 1]) / tonumber(ARGV[base + 2])) + 1)
+end
+return {0, "0"}
+"""
+
+# KEYS[1]: 记录请求时间的 sorted set
+# ARGV: now, num, limit, window, member
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local num = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local window = tonumber(ARGV[4])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+local count = redis.call("ZCARD", KEYS[1])
+if count + num > limit then
+    local oldest = redis.call("ZRANGE", KEYS[1], count + num - limit - 1, count + num - limit - 1, "WITHSCORES")
+    if oldest[2] == nil then
+        return {0, tostring(window)}
+    end
+    return {0, tostring(tonumber(oldest[2]) + window - now)}
+end
+for i = 1, num do
+    redis.call("ZADD", KEYS[1], now, ARGV[5] .. ":" .. i)
+end
+redis.call("EXPIRE", KEYS[1], math.ceil(window) + 1)
+return {1, "0"}
+"""
+
+_scripts = {}
+
+
+def _run_script(redis_conn, source, keys, args):
+    """
+    每个脚本只注册一次, sha 和 connection 无关, 执行时使用传入的 redis_conn, 服务器上没有这个脚本时 redis-py 会重新加载
+    """
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = redis_conn.register_script(source)
+    return script(keys=keys, args=args, client=redis_conn)
+
 
 class TokenBucket:
     """
-    注意：对于单个key的操作不是线程安全的
+    bucket 的状态保存在 redis hash 中, 读取, 填充和扣除在一个 lua 脚本中完成, 一次请求并且是原子的
     """
     def __init__(self, key, capacity, fill_rate, default_capacity, redis_conn):
         """
@@ -12,61 +82,60 @@ class TokenBucket:
         :param default_capacity: 初始容量
         :param redis_conn: redis connection
         """
+        # lua 脚本中需要除以 fill_rate
+        if fill_rate <= 0:
+            raise ValueError("fill_rate must be positive")
         self._key = key
         self._capacity = capacity
         self._fill_rate = fill_rate
         self._default_capacity = default_capacity
         self._redis_conn = redis_conn
 
-        self._last_capacity_key = "last_capacity"
-        self._last_timestamp_key = "last_timestamp"
-
-    def _init_key(self):
-        self._last_capacity = self._default_capacity
-        now = time.time()
-        self._last_timestamp = now
-        return self._default_capacity, now
-
-    @property
-    def _last_capacity(self):
-        last_capacity = self._redis_conn.hget(self._key, self._last_capacity_key)
-        if last_capacity is None:
-            return self._init_key()[0]
-        else:
-            return float(last_capacity)
-
-    @_last_capacity.setter
-    def _last_capacity(self, value):
-        self._redis_conn.hset(self._key, self._last_capacity_key, value)
+    def consume(self, num=1):
+        """
+        消耗 num 个 token，返回是否成功
+        :param num:
+        :return: result: bool, wait_time: float
+        """
+        bucket, wait = self.consume_all([self], num)
+        return bucket is None, wait
 
-    @property
-    def _last_timestamp(self):
-        return float(self._redis_conn.hget(self._key, self._last_timestamp_key))
+    @staticmethod
+    def consume_all(buckets, num=1):
+        """
+        在一次 redis 请求中从多个 bucket 各消耗 num 个 token, 只有全部足够时才会扣除
+        所有 bucket 需要使用同一个 redis connection
+        :return: 成功时返回 (None, 0), 否则返回 (第一个 token 不足的 bucket, wait_time)
+        """
+        args = [time.time(), num]
+        for bucket in buckets:
+            args.extend([bucket._capacity, bucket._fill_rate, bucket._default_capacity])
+        index, wait = _run_script(buckets[0]._redis_conn, TOKEN_BUCKET_SCRIPT,
+                                  keys=[bucket._key for bucket in buckets], args=args)
+        if index == 0:
+            return None, 0
+        return buckets[index - 1], float(wait)
 
-    @_last_timestamp.setter
-    def _last_timestamp(self, value):
-        self._redis_conn.hset(self._key, self._last_timestamp_key, value)
 
-    def _try_to_fill(self, now):
-        delta = self._fill_rate * (now - self._last_timestamp)
-        return min(self._last_capacity + delta, self._capacity)
+class SlidingWindow:
+    """
+    滑动窗口限流, 任意 window 秒内最多 limit 次, 每次请求的时间保存在 redis sorted set 中
+    """
+    def __init__(self, key, limit, window, redis_conn):
+        """
+        :param limit: 窗口内最多的请求次数
+        :param window: 窗口大小/秒
+        :param redis_conn: redis connection
+        """
+        self._key = key
+        self._limit = limit
+        self._window = window
+        self._redis_conn = redis_conn
 
     def consume(self, num=1):
         """
-        消耗 num 个 token，返回是否成功
-        :param num:
         :return: result: bool, wait_time: float
         """
-        # print("capacity ", self.fill(time.time()))
-        if self._last_capacity >= num:
-            self._last_capacity -= num
-            return True, 0
-        else:
-            now = time.time()
-            cur_num = self._try_to_fill(now)
-            if cur_num >= num:
-                self._last_capacity = cur_num - num
-                self._last_timestamp = now
-                return True, 0
-            else:
-                return False, (num - cur_num) / self._fill_rate
+        result, wait = _run_script(self._redis_conn, SLIDING_WINDOW_SCRIPT, keys=[self._key],
+                                   args=[time.time(), num, self._limit, self._window, rand_str()])
+        return bool(result), float(wait)